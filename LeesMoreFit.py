@@ -1,8 +1,13 @@
 import streamlit as st
 import pandas as pd
+import numpy as np
 import plotly.express as px
 import plotly.graph_objects as go
-from fitparse import FitFile
+from fit_parser import parse_fit_bytes, parse_fit_job, read_cached_frame, write_cached_frame, combine_activity_frames
+from concurrent.futures import ProcessPoolExecutor
+from utils import format_duration, format_duration_column, file_digest
+from ui_helpers import to_csv_bytes, select_view, clear_cache_button, show_paginated_dataframe
+import os
 from datetime import datetime, timedelta
 
 # --- Pagina Configuratie ---
@@ -13,116 +18,167 @@ st.set_page_config(
     initial_sidebar_state="expanded"
 )
 
+# Map waarin geparste FIT-bestanden (per inhoudshash) bewaard worden, zodat ze ook na een herlaadactie niet opnieuw geparst worden
+FIT_CACHE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '.fit_cache')
+
 # --- Helper Functies ---
-def format_duration(seconds):
-    """Formateert een aantal seconden naar HH:MM:SS string."""
-    if pd.isna(seconds) or seconds == 0:
-        return "00:00:00"
-    seconds = int(seconds)
-    hours = seconds // 3600
-    minutes = (seconds % 3600) // 60
-    seconds = seconds % 60
-    return f"{hours:02d}:{minutes:02d}:{seconds:02d}"
+def downsample_per_activity(df, target_points=2000):
+    """
+    Dunt de punten per activiteit uit tot ongeveer target_points (vaste stapgrootte).
+    Het laatste punt van elke activiteit blijft behouden.
+    """
+    parts = []
+    for _, activity_df in df.groupby('Activity_ID', sort=False, observed=True):
+        step = max(1, len(activity_df) // target_points)
+        positions = np.arange(0, len(activity_df), step)
+        if positions[-1] != len(activity_df) - 1:
+            positions = np.append(positions, len(activity_df) - 1)
+        parts.append(activity_df.iloc[positions])
+    return pd.concat(parts) if parts else df
 
 @st.cache_data(show_spinner="FIT bestand(en) inlezen en verwerken...")
-def parse_fit_file(file_bytes, activity_id):
+def parse_fit_file(file_hash, activity_id, _fit_source):
     """
-    Parses a .fit file from bytes and extracts relevant activity data.
-    Returns a DataFrame with key metrics.
+    Cached wrapper around fit_parser.parse_fit_bytes that reports parse errors in the app.
+    Returns an empty DataFrame on failure. The cache is keyed on (file_hash, activity_id); _fit_source (bytes or a file-like object) is not hashed by Streamlit.
     """
     try:
-        fit_file = FitFile(file_bytes)
-
-        records_data = []
-        for record in fit_file.get_messages('record'):
-            data = {}
-            for field in record.fields:
-                data[field.name] = field.value
-            records_data.append(data)
-
-        df = pd.DataFrame(records_data)
-
-        # Rename common columns to a standardized format
-        column_renames = {
-            'timestamp': 'DatumTijd',
-            'position_lat': 'Latitude_semicircles', # Raw format from FIT
-            'position_long': 'Longitude_semicircles', # Raw format from FIT
-            'distance': 'Afstand_m',
-            'heart_rate': 'Hartslag_bpm',
-            'cadence': 'Cadans_rpm', # or spm for running
-            'speed': 'Snelheid_ms', # meters/second
-            'altitude': 'Hoogte_m',
-            'power': 'Vermogen_watts',
-        }
-        df.rename(columns=column_renames, inplace=True)
-
-        # Convert raw semicircles GPS to degrees
-        # 1 semicircle = 180 / 2^31 degrees
-        if 'Latitude_semicircles' in df.columns and 'Longitude_semicircles' in df.columns:
-            df['Latitude'] = df['Latitude_semicircles'] * (180 / 2**31)
-            df['Longitude'] = df['Longitude_semicircles'] * (180 / 2**31)
-            df.drop(columns=['Latitude_semicircles', 'Longitude_semicircles'], inplace=True)
-        else:
-            df['Latitude'] = pd.NA
-            df['Longitude'] = pd.NA
-
-        # Convert to more readable units
-        if 'Afstand_m' in df.columns:
-            df['Afstand_km'] = df['Afstand_m'] / 1000
-        else:
-            df['Afstand_km'] = 0.0
-
-        if 'Snelheid_ms' in df.columns:
-            df['Snelheid_kmh'] = df['Snelheid_ms'] * 3.6
-        else:
-            df['Snelheid_kmh'] = 0.0
-
-        # Ensure datetime column is correct
-        if 'DatumTijd' in df.columns:
-            df['DatumTijd'] = pd.to_datetime(df['DatumTijd'], errors='coerce')
-            df.dropna(subset=['DatumTijd'], inplace=True) # Drop rows where datetime is invalid
-            df = df.sort_values(by='DatumTijd').reset_index(drop=True)
-            df['Tijd_sec'] = (df['DatumTijd'] - df['DatumTijd'].iloc[0]).dt.total_seconds()
-        else:
-            st.error("Geen 'timestamp' data gevonden in het FIT-bestand. Kan geen dashboard genereren.")
-            return pd.DataFrame()
-
-        # Add the unique activity ID to the DataFrame
-        df['Activity_ID'] = activity_id
-
-        # --- Extract Session/Activity Summary Data (for KPIs) ---
-        # Initialize with default values
-        session_calories = 0
-        session_max_speed_kmh = 0
-        session_total_elevation_gain_m = 0
-        activity_type = "Onbekend"
-
-        # Loop through session messages to get summary data
-        for session in fit_file.get_messages('session'):
-            session_dict = session.as_dict()
-            if 'sport' in session_dict and session_dict['sport'] is not None:
-                activity_type = str(session_dict['sport']).replace('_', ' ').title()
-            if 'total_calories' in session_dict and session_dict['total_calories'] is not None:
-                session_calories = session_dict['total_calories']
-            if 'max_speed' in session_dict and session_dict['max_speed'] is not None:
-                session_max_speed_kmh = session_dict['max_speed'] * 3.6 # Convert m/s to km/h
-            if 'total_elevation_gain' in session_dict and session_dict['total_elevation_gain'] is not None:
-                 session_total_elevation_gain_m = session_dict['total_elevation_gain']
-            break # Take the first found session, usually one session per file for an activity
-
-        # Add these session-level totals as single-value columns to the DataFrame
-        # This makes it easier to pass them around and display in KPIs
-        df['Activiteitstype'] = activity_type
-        df['Totale_Calorieën'] = session_calories
-        df['Max_Snelheid_Activiteit'] = session_max_speed_kmh
-        df['Totale_Stijging_Meters'] = session_total_elevation_gain_m
-
-        return df
-
+        return parse_fit_bytes(_fit_source, activity_id)
     except Exception as e:
         st.error(f"Fout bij het parsen van FIT-bestand '{activity_id}': {e}")
         return pd.DataFrame()
 
+@st.cache_data(show_spinner=False)
+def build_summary(df):
+    """Bouwt de overzichtstabel met één rij per activiteit (gecachet zolang df niet verandert)."""
+    # Snelheden en hartslagen van 0 tellen niet mee in het gemiddelde: maskeer ze vooraf als NaN,
+    # zodat de ingebouwde 'mean' gebruikt kan worden i.p.v. een lambda per groep.
+    # Alleen de benodigde kolommen worden meegenomen, zodat niet het hele DataFrame gekopieerd wordt.
+    summary_source = pd.DataFrame({
+        'Activity_ID': df['Activity_ID'],
+        'DatumTijd': df['DatumTijd'],
+        'Afstand_km': df['Afstand_km'],
+        '_Snelheid_pos': df['Snelheid_kmh'].where(df['Snelheid_kmh'] > 0),
+        '_HR_pos': df['Hartslag_bpm'].where(df['Hartslag_bpm'] > 0),
+        'Hartslag_bpm': df['Hartslag_bpm'],
+        'Tijd_sec': df['Tijd_sec'],
+        'Activiteitstype': df['Activiteitstype'],
+    })
+
+    # Aggregeer de data per activiteit voor de tabel
+    # We groeperen op Activity_ID en berekenen de gewenste statistieken
+    summary_df = summary_source.groupby('Activity_ID', observed=True).agg(
+        # Datum: De startdatum van de activiteit
+        Datum=('DatumTijd', 'min'),
+        # Totale afstand (max van de cumulatieve afstand in Afstand_km)
+        Totale_Afstand_km=('Afstand_km', 'max'),
+        # Gemiddelde snelheid per uur (gemiddelde van de snelheden in km/u)
+        Gemiddelde_Snelheid_kmh=('_Snelheid_pos', 'mean'),
+        # Gemiddelde hartslag
+        Gemiddelde_Hartslag=('_HR_pos', 'mean'),
+        # Maximale hartslag
+        Maximale_Hartslag=('Hartslag_bpm', 'max'),
+        # Totale duur (max van de cumulatieve tijd in Tijd_sec)
+        Totale_Duur_sec=('Tijd_sec', 'max'),
+        # Activiteitstype
+        Activiteitstype=('Activiteitstype', 'first')
+    ).reset_index()
+
+    # Formatteer de startdatum in één keer voor alle activiteiten
+    summary_df['Datum'] = summary_df['Datum'].dt.strftime('%Y-%m-%d').fillna('N/B')
+
+    # Formatteer de Totale_Duur_sec naar HH:MM:SS
+    summary_df['Totale_Duur'] = format_duration_column(summary_df['Totale_Duur_sec'])
+
+    # Rond de numerieke kolommen af en zorg voor goede weergave (als float64: een afgeronde float32 toont bijv. 55.700001)
+    summary_df['Totale_Afstand_km'] = summary_df['Totale_Afstand_km'].astype(np.float64).round(2)
+    summary_df['Gemiddelde_Snelheid_kmh'] = summary_df['Gemiddelde_Snelheid_kmh'].astype(np.float64).round(1)
+    summary_df['Gemiddelde_Hartslag'] = summary_df['Gemiddelde_Hartslag'].round(0).astype('Int64') # Int64 voor NaN support
+    summary_df['Maximale_Hartslag'] = summary_df['Maximale_Hartslag'].round(0).astype('Int64')
+
+    # Selecteer en herordenen de kolommen voor de weergave
+    display_columns = [
+        'Activity_ID',
+        'Datum',
+        'Activiteitstype',
+        'Totale_Afstand_km',
+        'Totale_Duur',
+        'Gemiddelde_Snelheid_kmh',
+        'Gemiddelde_Hartslag',
+        'Maximale_Hartslag'
+    ]
+    # Hernoem kolommen voor een mooiere weergave in de tabel (de kolomselectie is al een nieuw DataFrame, dus geen .copy() nodig)
+    summary_df = summary_df[display_columns].rename(columns={
+        'Activity_ID': 'Bestandsnaam',
+        'Totale_Afstand_km': 'Afstand (km)',
+        'Gemiddelde_Snelheid_kmh': 'Gem. Snelheid (km/u)',
+        'Gemiddelde_Hartslag': 'Gem. Hartslag (bpm)',
+        'Maximale_Hartslag': 'Max. Hartslag (bpm)',
+        'Totale_Duur': 'Duur (UU:MM:SS)'
+    })
+
+    return summary_df
+
+@st.cache_data(show_spinner=False)
+def build_route_figure(df_map):
+    """Bouwt de routekaart met start- en eindpunten (gecachet zolang df_map niet verandert)."""
+    # Gemiddelde positie om de kaart te centreren (één numpy-reductie over beide kolommen)
+    center = np.nanmean(df_map[['Latitude', 'Longitude']].to_numpy(dtype=np.float64), axis=0)
+    center_lat, center_lon = float(center[0]), float(center[1])
+
+    # Maak de kaart (met uitgedunde route: de kaart toont toch niet meer detail)
+    # Alle routes in één lijn-trace: de activiteiten worden gescheiden door een lege (NaN) waarde
+    route = downsample_per_activity(df_map)
+    activity_values = route['Activity_ID'].to_numpy()
+    breaks = np.flatnonzero(activity_values[1:] != activity_values[:-1]) + 1
+    hover_columns = [column for column in ['Activity_ID', 'DatumTijd', 'Afstand_km', 'Hartslag_bpm'] if column in route.columns]
+    hover_formats = {'Afstand_km': ':.2f', 'Hartslag_bpm': ':.0f'}
+    hover_template = '<b>%{customdata[0]}</b>' + ''.join(
+        f'<br>{column}=%{{customdata[{i}]{hover_formats.get(column, "")}}}' for i, column in enumerate(hover_columns) if i > 0
+    ) + '<extra></extra>'
+
+    fig_map = go.Figure(go.Scattermapbox(
+        lat=np.insert(route['Latitude'].to_numpy(dtype=np.float64), breaks, np.nan),
+        lon=np.insert(route['Longitude'].to_numpy(dtype=np.float64), breaks, np.nan),
+        mode='lines',
+        line=dict(width=5),
+        name='Routes',
+        customdata=np.insert(route[hover_columns].to_numpy(dtype=object), breaks, None, axis=0),
+        hovertemplate=hover_template
+    ))
+    fig_map.update_layout(
+        mapbox_style="open-street-map",
+        mapbox_zoom=12,
+        height=1100, # Aangepaste hoogte voor betere visualisatie
+        title="Afgelegde Routes"
+    )
+
+    # Optioneel: Voeg start- en eindpunten toe voor ELKE activiteit
+    # Alle startpunten in één trace en alle eindpunten in één trace (i.p.v. 2 traces per activiteit)
+    start_end = df_map.groupby('Activity_ID', sort=False, observed=True)[['Latitude', 'Longitude']].agg(['first', 'last'])
+    activity_ids = start_end.index.to_numpy()
+    fig_map.add_trace(go.Scattermapbox(
+        lat=start_end[('Latitude', 'first')].to_numpy(),
+        lon=start_end[('Longitude', 'first')].to_numpy(),
+        mode='markers',
+        marker=go.scattermapbox.Marker(size=10, color='green', symbol='circle'),
+        name='Startpunten', # Naam voor de legenda
+        text=[f'Start: {activity_id}' for activity_id in activity_ids],
+        hoverinfo='text'
+    ))
+    fig_map.add_trace(go.Scattermapbox(
+        lat=start_end[('Latitude', 'last')].to_numpy(),
+        lon=start_end[('Longitude', 'last')].to_numpy(),
+        mode='markers',
+        marker=go.scattermapbox.Marker(size=10, color='red', symbol='circle'),
+        name='Eindpunten', # Naam voor de legenda
+        text=[f'Eind: {activity_id}' for activity_id in activity_ids],
+        hoverinfo='text'
+    ))
+
+    fig_map.update_layout(mapbox_center={"lat": center_lat, "lon": center_lon})
+    return fig_map
+
 # --- Zijbalk voor bestand uploaden ---
 with st.sidebar:
     st.header("Upload je FIT-bestand(en)")
@@ -131,42 +187,76 @@ with st.sidebar:
     # Gebruik 'accept_multiple_files=True' om meerdere bestanden toe te staan
     uploaded_fit_files = st.file_uploader("Kies .fit bestand(en)", type=["fit"], accept_multiple_files=True)
 
-    # Initialiseer st.session_state.fit_dfs_list om geparste individuele DFs te bewaren
-    if 'fit_dfs_list' not in st.session_state:
-        st.session_state.fit_dfs_list = []
+    clear_cache_button(FIT_CACHE_DIR, parse_fit_file, 'fit_file_hashes',
+                       "Parse geüploade bestanden opnieuw i.p.v. de bewaarde geparste versie te gebruiken.")
+
+    # Initialiseer st.session_state.fit_file_hashes ({bestandsnaam: inhoudshash}) om wijzigingen te detecteren
+    # Het gecombineerde st.session_state.fit_df (records) en st.session_state.sessions_df (sessietotalen) bevatten de data
+    if 'fit_file_hashes' not in st.session_state:
+        st.session_state.fit_file_hashes = {}
 
     if uploaded_fit_files:
         # Check if current selection is different from previous to avoid re-parsing
-        current_file_names = {f.name for f in uploaded_fit_files}
-        previous_file_names = {df.attrs['original_filename'] for df in st.session_state.fit_dfs_list if 'original_filename' in df.attrs}
+        files_by_name = {f.name: f for f in uploaded_fit_files}
+        current_file_hashes = {name: file_digest(f) for name, f in files_by_name.items()}
 
-        if current_file_names != previous_file_names:
-            st.session_state.fit_dfs_list = [] # Reset de lijst bij een nieuwe selectie
+        if current_file_hashes != st.session_state.fit_file_hashes:
             st.info(f"Verwerken van {len(uploaded_fit_files)} bestand(en)...")
-            all_dfs = []
-            for idx, uploaded_file in enumerate(uploaded_fit_files):
-                # Gebruik de bestandsnaam als unieke Activity_ID
-                df_temp = parse_fit_file(uploaded_file.read(), uploaded_file.name)
-                if not df_temp.empty:
-                    df_temp.attrs['original_filename'] = uploaded_file.name # Bewaar de originele bestandsnaam
-                    all_dfs.append(df_temp)
+            # Gebruik de bestandsnaam als unieke Activity_ID
+            # Bestanden die al eens geparst zijn worden uit de schijfcache geladen
+            parsed_by_name = {}
+            files_to_parse = {}
+            for name, f in files_by_name.items():
+                cached_df = read_cached_frame(FIT_CACHE_DIR, current_file_hashes[name], name)
+                if cached_df is not None:
+                    parsed_by_name[name] = cached_df
+                else:
+                    files_to_parse[name] = f
+
+            if len(files_to_parse) == 1:
+                # Eén bestand: direct in dit proces parsen, zonder procespool (parse_fit_bytes leest de inhoud met getvalue())
+                activity_id, uploaded_file = next(iter(files_to_parse.items()))
+                parsed_by_name[activity_id] = parse_fit_file(current_file_hashes[activity_id], activity_id, uploaded_file)
+            elif files_to_parse:
+                # Meerdere bestanden: parse ze parallel in aparte processen (die hebben de bytes nodig)
+                jobs = [(f.getvalue(), name) for name, f in files_to_parse.items()]
+                with ProcessPoolExecutor(max_workers=min(os.cpu_count() or 1, len(jobs))) as executor:
+                    for (_, activity_id), (df_temp, error) in zip(jobs, executor.map(parse_fit_job, jobs)):
+                        if error is not None:
+                            st.error(f"Fout bij het parsen van FIT-bestand '{activity_id}': {error}")
+                        parsed_by_name[activity_id] = df_temp
+
+            for name in files_to_parse:
+                if not parsed_by_name[name].empty:
+                    write_cached_frame(FIT_CACHE_DIR, current_file_hashes[name], parsed_by_name[name])
+
+            parsed_dfs = [parsed_by_name[name] for name in files_by_name]
+            all_dfs = [df_temp for df_temp in parsed_dfs if not df_temp.empty]
+            st.session_state.fit_file_hashes = current_file_hashes
 
             if all_dfs:
-                # Combineer alle geparste DataFrames in één groot DataFrame
-                st.session_state.fit_df = pd.concat(all_dfs, ignore_index=True)
-                st.session_state.fit_dfs_list = all_dfs # Bewaar ook de individuele DFs voor eventuele toekomstige behoeften
+                if len(all_dfs) == 1:
+                    # Eén bestand: het geparste DataFrame kan direct gebruikt worden (geen kopie via concat)
+                    fit_df = all_dfs[0]
+                else:
+                    # Combineer alle geparste DataFrames in één groot DataFrame (categoriekolommen blijven 'category')
+                    fit_df = combine_activity_frames(all_dfs)
+                st.session_state.fit_df = fit_df
+                # Eén rij per activiteit met de totalen uit het sessiebericht
+                st.session_state.sessions_df = pd.DataFrame([df_temp.attrs['session'] for df_temp in all_dfs])
                 st.success(f"{len(all_dfs)} FIT bestand(en) succesvol ingelezen!")
             else:
                 st.warning("Geen bruikbare data gevonden in de geüploade FIT bestanden.")
                 st.session_state.fit_df = pd.DataFrame()
-                st.session_state.fit_dfs_list = []
+                st.session_state.sessions_df = pd.DataFrame()
         else:
             if not st.session_state.fit_df.empty:
                 st.success(f"{len(uploaded_fit_files)} FIT bestand(en) zijn al geladen.")
     else:
         # Reset de DataFrames als er geen bestanden geselecteerd zijn
         st.session_state.fit_df = pd.DataFrame()
-        st.session_state.fit_dfs_list = []
+        st.session_state.sessions_df = pd.DataFrame()
+        st.session_state.fit_file_hashes = {}
         st.info("Upload een of meerdere .fit bestanden met je sportactiviteiten om het dashboard te genereren.")
 
 # --- Hoofd Dashboard Content ---
@@ -177,6 +267,7 @@ if st.session_state.get('fit_df', pd.DataFrame()).empty:
     st.info("Upload een of meerdere .fit-bestanden in de zijbalk om je sportactiviteit(en) te analyseren. Deze app is specifiek voor .fit-bestanden.")
 else:
     df = st.session_state.fit_df # Dit DataFrame bevat nu alle gecombineerde data
+    sessions_df = st.session_state.sessions_df # Eén rij per activiteit met de sessietotalen
 
     # --- Algemene KPI's ---
     st.subheader("Overzicht van de Activiteiten")
@@ -184,23 +275,29 @@ else:
     # Bereken KPI's over ALLE activiteiten in het gecombineerde DataFrame
     num_activities = df['Activity_ID'].nunique()
 
+    # Afstand, duur en gemiddelde hartslag per activiteit in één groupby-doorgang (alleen de aanwezige kolommen)
+    kpi_aggregations = {name: (column, func) for name, column, func in [
+        ('max_afstand', 'Afstand_km', 'max'), ('max_tijd', 'Tijd_sec', 'max'), ('gem_hartslag', 'Hartslag_bpm', 'mean'),
+    ] if column in df.columns}
+    per_activity = df.groupby('Activity_ID', observed=True).agg(**kpi_aggregations)
+
     # Totale afstand van de langste activiteit OF de som van alle afstanden (kies degene die je wilt)
     # Hier is de som van de max afstanden per activiteit:
-    total_distance_combined_km = df.groupby('Activity_ID')['Afstand_km'].max().sum() if 'Afstand_km' in df.columns else 0
+    total_distance_combined_km = per_activity['max_afstand'].sum() if 'max_afstand' in per_activity.columns else 0
 
     # Som van de duur van elke activiteit
-    total_duration_seconds_combined = df.groupby('Activity_ID')['Tijd_sec'].max().sum() if 'Tijd_sec' in df.columns else 0
+    total_duration_seconds_combined = per_activity['max_tijd'].sum() if 'max_tijd' in per_activity.columns else 0
 
     # Gemiddelde hartslag over alle activiteiten (gemiddelde van de gemiddelden per activiteit)
-    avg_heart_rate_combined = df.groupby('Activity_ID')['Hartslag_bpm'].mean().mean() if 'Hartslag_bpm' in df.columns else 0
+    avg_heart_rate_combined = per_activity['gem_hartslag'].mean() if 'gem_hartslag' in per_activity.columns else 0
 
     # Max hartslag over alle activiteiten (maximum van alle geregistreerde hartslagen)
     max_heart_rate_overall = df['Hartslag_bpm'].max() if 'Hartslag_bpm' in df.columns else 0
 
-    # Deze KPI's komen nu direct uit de sessie-data die we aan de DF hebben toegevoegd
-    total_calories_combined = df['Totale_Calorieën'].sum() if 'Totale_Calorieën' in df.columns else 0
-    max_speed_kmh_combined_from_session = df['Max_Snelheid_Activiteit'].max() if 'Max_Snelheid_Activiteit' in df.columns else 0
-    total_elevation_gain_combined = df['Totale_Stijging_Meters'].sum() if 'Totale_Stijging_Meters' in df.columns else 0
+    # Deze KPI's komen direct uit de sessie-data (één rij per activiteit)
+    total_calories_combined = sessions_df['Totale_Calorieën'].sum()
+    max_speed_kmh_combined_from_session = sessions_df['Max_Snelheid_Activiteit'].max()
+    total_elevation_gain_combined = sessions_df['Totale_Stijging_Meters'].sum()
 
 
     kpi1, kpi2, kpi3, kpi4 = st.columns(4)
@@ -224,9 +321,11 @@ else:
 
     st.markdown("---")
 
-    tab_performance, tab_map, tab_table, tab_raw_data = st.tabs(["📊 Prestaties over Tijd", "🗺️ Activiteit Route", "📋 Overzicht Tabel", "📋 Ruwe Data"])
+    # De kaart wordt zo alleen getekend als de route-weergave gekozen is
+    view_options = ["📊 Prestaties over Tijd", "🗺️ Activiteit Route", "📋 Overzicht Tabel", "📋 Ruwe Data"]
+    active_view = select_view(view_options)
 
-    with tab_performance:
+    if active_view == view_options[0]:
         st.subheader("Prestaties over Tijd (per activiteit)")
         # Voeg een selector toe om specifieke activiteiten te kiezen voor de tijdreeksgrafieken
         activity_selection_for_plots = st.selectbox(
@@ -234,7 +333,7 @@ else:
             options=['Alle Activiteiten (overlay)'] + sorted(list(df['Activity_ID'].unique())), # Optie om alles te overlayen, gesorteerd
             key="activity_plot_select"
         )
-        plot_df = df.copy()
+        plot_df = df # Wordt alleen gelezen, dus geen .copy() nodig
         if activity_selection_for_plots != 'Alle Activiteiten (overlay)':
             plot_df = df[df['Activity_ID'] == activity_selection_for_plots]
 
@@ -265,9 +364,11 @@ else:
             y_column = plottable_metrics[selected_metric]
 
             if 'DatumTijd' in plot_df.columns and not plot_df.empty and not plot_df['DatumTijd'].empty:
+                # Stuur per activiteit hooguit ~2000 punten naar de browser i.p.v. elke seconde
+                line_df = downsample_per_activity(plot_df[['DatumTijd', y_column, 'Activity_ID']])
                 # Voeg 'color='Activity_ID'' toe voor meerdere lijnen als 'Alle Activiteiten' is geselecteerd
                 fig = px.line(
-                    plot_df,
+                    line_df,
                     x='DatumTijd',
                     y=y_column,
                     color='Activity_ID' if activity_selection_for_plots == 'Alle Activiteiten (overlay)' else None, # Kleur per activiteit
@@ -285,148 +386,53 @@ else:
                     ])
                 ))
                 fig.update_layout(hovermode="x unified")
+                fig.update_yaxes(hoverformat='.2f') # De float32-meetwaarden tonen anders bijv. 25.299999
                 st.plotly_chart(fig, use_container_width=True, config={'displayModeBar': True})
             else:
                 st.error("Kan geen tijdreeksgrafieken genereren, 'DatumTijd' kolom ontbreekt of is leeg na verwerking voor de geselecteerde activiteit(en).")
 
-    with tab_map:
+    if active_view == view_options[1]:
         st.subheader("Activiteiten Routes op Kaart")
         if 'Latitude' in df.columns and 'Longitude' in df.columns and df['Latitude'].notna().any() and df['Longitude'].notna().any():
             # Filter rijen met geldige GPS-coördinaten
-            df_map = df.dropna(subset=['Latitude', 'Longitude']).copy()
+            df_map = df.dropna(subset=['Latitude', 'Longitude']) # Wordt alleen gelezen, dus geen extra .copy() nodig
 
             if not df_map.empty:
-                # Gemiddelde positie om de kaart te centreren
-                center_lat = df_map['Latitude'].mean()
-                center_lon = df_map['Longitude'].mean()
-
-                # Maak de kaart
-                fig_map = px.line_mapbox(
-                    df_map,
-                    lat="Latitude",
-                    lon="Longitude",
-                    color="Activity_ID", # Kleurt de lijnen per Activity_ID
-                    zoom=12,
-                    height=1100, # Aangepaste hoogte voor betere visualisatie
-                    mapbox_style="open-street-map",
-                    title="Afgelegde Routes",
-                    hover_name="Activity_ID", # Toon Activity_ID bij hover
-                    hover_data={'DatumTijd': True, 'Afstand_km': ':.2f', 'Hartslag_bpm': True, 'Activity_ID': False}                    
-                )
-
-                fig_map.update_traces(line=dict(width=5)) # <-- NIEUWE REGEL HIER
-
-                # Optioneel: Voeg start- en eindpunten toe voor ELKE activiteit
-                for activity_id in df_map['Activity_ID'].unique():
-                    activity_df = df_map[df_map['Activity_ID'] == activity_id]
-                    if not activity_df.empty:
-                        # Startpunt
-                        fig_map.add_trace(go.Scattermapbox(
-                            lat=[activity_df['Latitude'].iloc[0]],
-                            lon=[activity_df['Longitude'].iloc[0]],
-                            mode='markers',
-                            marker=go.scattermapbox.Marker(size=10, color='green', symbol='circle'),
-                            name=f'Start: {activity_id}', # Naam voor de legenda
-                            hoverinfo='name'
-                        ))
-                        # Eindpunt
-                        fig_map.add_trace(go.Scattermapbox(
-                            lat=[activity_df['Latitude'].iloc[-1]],
-                            lon=[activity_df['Longitude'].iloc[-1]],
-                            mode='markers',
-                            marker=go.scattermapbox.Marker(size=10, color='red', symbol='circle'),
-                            name=f'Eind: {activity_id}', # Naam voor de legenda
-                            hoverinfo='name'
-                        ))
-
-                fig_map.update_layout(mapbox_center={"lat": center_lat, "lon": center_lon})
+                fig_map = build_route_figure(df_map)
                 st.plotly_chart(fig_map, use_container_width=True, config={'displayModeBar': True})
             else:
                 st.info("Geen geldige GPS-coördinaten gevonden in de bestanden om de routes te tonen.")
         else:
             st.info("Geen GPS-coördinaten (Latitude/Longitude) beschikbaar in de geüploade FIT-bestanden om de routes te tonen.")
 
+    if active_view == view_options[2]:
+        st.subheader("Overzicht van Alle Activiteiten")
 
-with tab_table:
-    st.subheader("Overzicht van Alle Activiteiten")
-
-    if not df.empty:
-        # Aggregeer de data per activiteit voor de tabel
-        # We groeperen op Activity_ID en berekenen de gewenste statistieken
-        summary_df = df.groupby('Activity_ID').agg(
-            # Datum: De startdatum van de activiteit
-            Datum=('DatumTijd', lambda x: x.min().strftime('%Y-%m-%d') if not x.empty else 'N/B'),
-            # Totale afstand (max van de cumulatieve afstand in Afstand_km)
-            Totale_Afstand_km=('Afstand_km', 'max'),
-            # Gemiddelde snelheid per uur (gemiddelde van de snelheden in km/u)
-            Gemiddelde_Snelheid_kmh=('Snelheid_kmh', lambda x: x[x > 0].mean() if not x.empty else 0),
-            # Gemiddelde hartslag
-            Gemiddelde_Hartslag=('Hartslag_bpm', lambda x: x[x > 0].mean() if not x.empty else 0),
-            # Maximale hartslag
-            Maximale_Hartslag=('Hartslag_bpm', 'max'),
-            # Totale duur (max van de cumulatieve tijd in Tijd_sec)
-            Totale_Duur_sec=('Tijd_sec', 'max'),
-            # Activiteitstype
-            Activiteitstype=('Activiteitstype', 'first')
-        ).reset_index()
-
-        # Formatteer de Totale_Duur_sec naar HH:MM:SS
-        summary_df['Totale_Duur'] = summary_df['Totale_Duur_sec'].apply(format_duration)
-
-        # Rond de numerieke kolommen af en zorg voor goede weergave
-        summary_df['Totale_Afstand_km'] = summary_df['Totale_Afstand_km'].round(2)
-        summary_df['Gemiddelde_Snelheid_kmh'] = summary_df['Gemiddelde_Snelheid_kmh'].round(1)
-        summary_df['Gemiddelde_Hartslag'] = summary_df['Gemiddelde_Hartslag'].round(0).astype('Int64') # Int64 voor NaN support
-        summary_df['Maximale_Hartslag'] = summary_df['Maximale_Hartslag'].round(0).astype('Int64')
-
-        # Selecteer en herordenen de kolommen voor de weergave
-        display_columns = [
-            'Activity_ID',
-            'Datum',
-            'Activiteitstype',
-            'Totale_Afstand_km',
-            'Totale_Duur',
-            'Gemiddelde_Snelheid_kmh',
-            'Gemiddelde_Hartslag',
-            'Maximale_Hartslag'
-        ]
-        summary_df = summary_df[display_columns].copy()
-
-        # Hernoem kolommen voor een mooiere weergave in de tabel
-        summary_df.rename(columns={
-            'Activity_ID': 'Bestandsnaam',
-            'Totale_Afstand_km': 'Afstand (km)',
-            'Gemiddelde_Snelheid_kmh': 'Gem. Snelheid (km/u)',
-            'Gemiddelde_Hartslag': 'Gem. Hartslag (bpm)',
-            'Maximale_Hartslag': 'Max. Hartslag (bpm)',
-            'Totale_Duur': 'Duur (UU:MM:SS)'
-        }, inplace=True)
-
-        st.dataframe(summary_df, use_container_width=True)
-
-        # Optioneel: Download knop voor deze specifieke tabel
-        csv_export_summary = summary_df.to_csv(index=False).encode('utf-8')
-        st.download_button(
-            label="Download overzichtstabel als CSV",
-            data=csv_export_summary,
-            file_name="fit_summary_table.csv",
-            mime="text/csv",
-        )
+        if not df.empty:
+            summary_df = build_summary(df)
 
-    else:
-        st.info("Geen activiteiten geladen om een overzichtstabel te tonen.")
+            st.dataframe(summary_df, use_container_width=True)
 
+            # Optioneel: Download knop voor deze specifieke tabel
+            st.download_button(
+                label="Download overzichtstabel als CSV",
+                data=to_csv_bytes(summary_df),
+                file_name="fit_summary_table.csv",
+                mime="text/csv",
+            )
+
+        else:
+            st.info("Geen activiteiten geladen om een overzichtstabel te tonen.")
 
-    with tab_raw_data: # Ruwe Data tab
+    if active_view == view_options[3]: # Ruwe Data
         st.header("Ruwe Gegevens")
         st.markdown("Hier kun je de verwerkte ruwe data van alle activiteiten bekijken en eventueel exporteren.")
         if not st.session_state.fit_df.empty:
-            st.dataframe(st.session_state.fit_df)
+            show_paginated_dataframe(st.session_state.fit_df, page_size=5000)
 
-            csv_export = st.session_state.fit_df.to_csv(index=False).encode('utf-8')
             st.download_button(
                 label="Download verwerkte data als CSV",
-                data=csv_export,
+                data=to_csv_bytes(st.session_state.fit_df),
                 file_name="fit_data_processed_combined.csv",
                 mime="text/csv",
             )
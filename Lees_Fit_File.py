@@ -226,7 +226,7 @@ else:
         st.subheader("Activiteit Route op Kaart")
         if 'Latitude' in df.columns and 'Longitude' in df.columns and df['Latitude'].notna().any() and df['Longitude'].notna().any():
             # Filter rijen met geldige GPS-coördinaten
-            df_map = df.dropna(subset=['Latitude', 'Longitude']).copy()
+            df_map = df.dropna(subset=['Latitude', 'Longitude']) # Wordt alleen gelezen, dus geen extra .copy() nodig
 
             if not df_map.empty:
                 # Gemiddelde positie om de kaart te centreren
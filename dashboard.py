@@ -1,7 +1,13 @@
 import streamlit as st
 import pandas as pd
+import numpy as np
 import plotly.express as px
+import plotly.graph_objects as go
 from datetime import datetime, timedelta
+from utils import format_duration, format_duration_column, file_digest, atomic_pickle_dump
+from export_data import parse_time_column_to_seconds, add_period_columns, period_aggregates, downsample_series
+from ui_helpers import to_csv_bytes, select_view, clear_cache_button, show_paginated_dataframe
+import os
 
 # --- Pagina Configuratie ---
 st.set_page_config(
@@ -11,148 +17,284 @@ st.set_page_config(
     initial_sidebar_state="expanded"
 )
 
+# Snelste Excel-lezer als python-calamine geïnstalleerd is, anders de standaard (openpyxl)
+try:
+    import python_calamine # noqa: F401
+    EXCEL_ENGINE = 'calamine'
+except ImportError:
+    EXCEL_ENGINE = None
+
+# Tekens waarmee de export een ontbrekende waarde aangeeft
+MISSING_VALUE_MARKERS = ['--']
+
+# Map waarin verwerkte exportbestanden (per inhoudshash) bewaard worden, zodat ze ook in een nieuwe sessie niet opnieuw ingelezen worden
+EXPORT_CACHE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '.export_cache')
+# Verhoog dit nummer als de verwerking in load_and_process_data verandert, zodat oude cachebestanden niet meer gebruikt worden
+EXPORT_CACHE_VERSION = 6
+
+# Knoppen om snel een recente periode te kiezen in de weekgrafieken (met schuifbalk)
+PERIOD_RANGESELECTOR = dict(
+    buttons=[
+        dict(count=1, label="1m", step="month", stepmode="backward"),
+        dict(count=6, label="6m", step="month", stepmode="backward"),
+        dict(count=1, label="1j", step="year", stepmode="backward"),
+        dict(step="all")
+    ]
+)
+
+# Mapping van verwachte Nederlandse kolomnamen naar interne, schone namen.
+# Alleen deze kolommen worden uit het exportbestand ingelezen.
+EXPORT_COLUMN_MAPPING = {
+    "Activiteittype": "activity_type",
+    "Datum": "date",
+    "Favoriet": "favorite",
+    "Titel": "title",
+    "Afstand": "distance_km",
+    "Calorieën": "calories_kcal",
+    "Tijd": "duration_raw",
+    "Gem. HS": "avg_heart_rate_bpm",
+    "Max. HS": "max_heart_rate_bpm",
+    "Gem. cadans": "avg_cadence",
+    "Maximale cadans": "max_cadence",
+    "Gemiddeld tempo": "avg_pace_raw",
+    "Beste tempo": "best_pace_raw",
+    "Totale stijging": "total_elevation_gain_m",
+    "Totale daling": "total_elevation_loss_m",
+    "Gem. staplengte": "avg_stride_length_cm",
+    "Training Stress Score": "tss",
+    "Stappen": "steps",
+    "Min. temp.": "min_temp_celsius",
+    "Decompressie": "decompression",
+    "Beste": "best_overall",
+}
+
 # --- Helper Functies ---
-@st.cache_data
-def load_and_process_data(uploaded_file):
-    """Laadt en verwerkt het geüploade Excel/CSV bestand."""
-    if uploaded_file.name.endswith('.csv'):
-        df = pd.read_csv(uploaded_file)
-    elif uploaded_file.name.endswith(('.xls', '.xlsx')):
-        df = pd.read_excel(uploaded_file)
+def clean_column_names(columns):
+    """Schoont kolomnamen op: spaties aan de randen verwijderen, speciale tekens ('Â®', harde spatie) weghalen."""
+    return pd.Index(columns).astype(str).str.strip().str.replace('Â®|\xa0', '', regex=True)
+
+def is_mapped_column(column_name):
+    """Geeft aan of een ruwe kolomnaam (na opschonen) in EXPORT_COLUMN_MAPPING voorkomt."""
+    return clean_column_names([column_name])[0] in EXPORT_COLUMN_MAPPING
+
+def load_data(uploaded_file):
+    """
+    Geeft het verwerkte DataFrame voor het geüploade bestand terug.
+    Eerst uit de schijfcache (ook na een herstart of in een nieuwe sessie), anders via load_and_process_data.
+    """
+    file_hash = file_digest(uploaded_file)
+    cache_path = os.path.join(EXPORT_CACHE_DIR, f"{file_hash}.v{EXPORT_CACHE_VERSION}.pkl")
+    try:
+        return pd.read_pickle(cache_path)
+    except Exception:
+        pass # Niet gecachet (of onleesbaar): opnieuw inlezen
+
+    df = load_and_process_data(file_hash, uploaded_file.name, uploaded_file)
+    if df is not None:
+        try:
+            atomic_pickle_dump(cache_path, df)
+        except OSError:
+            pass
+    return df
+
+@st.cache_data(show_spinner="Bestand inlezen en verwerken...")
+def load_and_process_data(file_hash, file_name, _uploaded_file):
+    """
+    Laadt en verwerkt het geüploade Excel/CSV bestand.
+    De cache is gekoppeld aan (file_hash, file_name); _uploaded_file wordt niet door Streamlit gehasht.
+    """
+    # Garmin exporteert ontbrekende waarden als '--': laat de parser die direct als NaN lezen,
+    # zodat numerieke kolommen al als getallen binnenkomen i.p.v. als tekst die achteraf opgeschoond moet worden
+    # Alleen de kolommen uit EXPORT_COLUMN_MAPPING inlezen: de overige exportkolommen worden nergens gebruikt
+    if file_name.endswith('.csv'):
+        # Standaard C-parser, niet engine='pyarrow': die leest een tempo als '11:55' als tijdstip, dat daarna op 0 uitkomt
+        df = pd.read_csv(_uploaded_file, usecols=is_mapped_column, na_values=MISSING_VALUE_MARKERS, low_memory=False)
+    elif file_name.endswith(('.xls', '.xlsx')):
+        df = pd.read_excel(_uploaded_file, engine=EXCEL_ENGINE, usecols=is_mapped_column, na_values=MISSING_VALUE_MARKERS)
     else:
         st.error("Ongeldig bestandsformaat. Upload alstublieft een .csv of .xlsx bestand.")
         return None
 
     # Kolomnamen opschonen: spaties verwijderen, speciale tekens vervangen
-    df.columns = df.columns.str.strip().str.replace('Â®', '', regex=False).str.replace('\xa0', '', regex=False)
-
-    # Definieer een mapping van verwachte Nederlandse kolomnamen naar interne, schone namen
-    column_mapping = {
-        "Activiteittype": "activity_type",
-        "Datum": "date",
-        "Favoriet": "favorite",
-        "Titel": "title",
-        "Afstand": "distance_km",
-        "Calorieën": "calories_kcal",
-        "Tijd": "duration_raw",
-        "Gem. HS": "avg_heart_rate_bpm",
-        "Max. HS": "max_heart_rate_bpm",
-        "Gem. cadans": "avg_cadence",
-        "Maximale cadans": "max_cadence",
-        "Gemiddeld tempo": "avg_pace_raw",
-        "Beste tempo": "best_pace_raw",
-        "Totale stijging": "total_elevation_gain_m",
-        "Totale daling": "total_elevation_loss_m",
-        "Gem. staplengte": "avg_stride_length_cm",
-        "Training Stress Score": "tss",
-        "Stappen": "steps",
-        "Min. temp.": "min_temp_celsius",
-        "Decompressie": "decompression",
-        "Beste": "best_overall",
-    }
+    df.columns = clean_column_names(df.columns)
 
     # Hernoem kolommen op basis van de mapping
-    df.rename(columns=column_mapping, inplace=True)
+    df.rename(columns=EXPORT_COLUMN_MAPPING, inplace=True)
 
     # Controleer en converteer essentiële kolommen
     if 'date' in df.columns:
-        df['date'] = pd.to_datetime(df['date'], errors='coerce')
+        if not pd.api.types.is_datetime64_any_dtype(df['date']): # Excel levert datums vaak al als datetime aan
+            df['date'] = pd.to_datetime(df['date'], errors='coerce')
         df.dropna(subset=['date'], inplace=True)
+        # Dag (zonder tijdstip) één keer vastleggen voor de aggregatie per dag
+        df['day'] = df['date'].dt.normalize()
     else:
         st.warning("De 'Datum' kolom is niet gevonden. Sommige functionaliteiten werken mogelijk niet correct.")
         df['date'] = pd.NaT # Voeg kolom toe met Not a Time
-
-    if 'distance_km' in df.columns:
-        df['distance_km'] = df['distance_km'].astype(str).str.replace(',', '.', regex=False).astype(float).fillna(0)
-    else:
-        st.warning("De 'Afstand' kolom is niet gevonden. Afstandsberekeningen zijn niet mogelijk.")
-        df['distance_km'] = 0.0
-
-    if 'calories_kcal' in df.columns:
-        df['calories_kcal'] = pd.to_numeric(df['calories_kcal'], errors='coerce').fillna(0)
-    else:
-        st.warning("De 'Calorieën' kolom is niet gevonden. Calorieberekeningen zijn niet mogelijk.")
-        df['calories_kcal'] = 0.0
-
-    if 'steps' in df.columns:
-        df['steps'] = pd.to_numeric(df['steps'], errors='coerce').fillna(0)
-    else:
-        st.warning("De 'Stappen' kolom is niet gevonden. Stappenberekeningen zijn niet mogelijk.")
-        df['steps'] = 0.0
-
-    if 'avg_heart_rate_bpm' in df.columns:
-        df['avg_heart_rate_bpm'] = pd.to_numeric(df['avg_heart_rate_bpm'], errors='coerce').fillna(0)
-    else:
-        st.warning("De 'Gem. HS' kolom is niet gevonden. Hartslag analyses zijn niet mogelijk.")
-        df['avg_heart_rate_bpm'] = 0.0
+        df['day'] = pd.NaT
+
+    # Numerieke kolommen in één doorgang omzetten: (waarschuwing als de kolom ontbreekt, komma als decimaalteken)
+    numeric_columns = {
+        'distance_km': ("De 'Afstand' kolom is niet gevonden. Afstandsberekeningen zijn niet mogelijk.", True),
+        'calories_kcal': ("De 'Calorieën' kolom is niet gevonden. Calorieberekeningen zijn niet mogelijk.", False),
+        'steps': ("De 'Stappen' kolom is niet gevonden. Stappenberekeningen zijn niet mogelijk.", False),
+        'avg_heart_rate_bpm': ("De 'Gem. HS' kolom is niet gevonden. Hartslag analyses zijn niet mogelijk.", False),
+    }
+    for column, (missing_warning, decimal_comma) in numeric_columns.items():
+        if column not in df.columns:
+            st.warning(missing_warning)
+            df[column] = np.float32(0)
+            continue
+        values = df[column]
+        # Alleen tekstkolommen (CSV) hoeven opgeschoond te worden; Excel levert al getallen aan
+        if decimal_comma and not pd.api.types.is_numeric_dtype(values):
+            # Een tekstkolom kan direct bewerkt worden; alleen een gemengde object-kolom (Excel) eerst naar tekst
+            if not pd.api.types.is_string_dtype(values) or values.dtype == object:
+                values = values.astype(str)
+            values = values.str.replace(',', '.', regex=False)
+        # float32 volstaat voor deze waarden en halveert het geheugengebruik t.o.v. float64
+        df[column] = pd.to_numeric(values, errors='coerce').fillna(0).astype(np.float32)
+    # Stappen zijn altijd hele aantallen: int32 is exact, ook bij het optellen over een lange periode
+    df['steps'] = df['steps'].round().astype(np.int32)
 
     if 'activity_type' not in df.columns:
         st.warning("De 'Activiteittype' kolom is niet gevonden. Analyses per activiteitstype zijn beperkt.")
         df['activity_type'] = 'Onbekend'
+    # Weinig verschillende waarden die op veel rijen herhaald worden: opslaan als categorie
+    df['activity_type'] = df['activity_type'].astype('category')
 
     # Tijd conversie: van HH:MM:SS string naar seconden
-    def parse_time_to_seconds(time_str):
-        if pd.isna(time_str): return 0
-        try:
-            parts = str(time_str).split(':')
-            if len(parts) == 3: return int(parts[0]) * 3600 + int(parts[1]) * 60 + int(parts[2])
-            elif len(parts) == 2: return int(parts[0]) * 60 + int(parts[1])
-            else: return float(time_str)
-        except (ValueError, TypeError): return 0
-
     if 'duration_raw' in df.columns:
-        df['duration_seconds'] = df['duration_raw'].apply(parse_time_to_seconds)
+        df['duration_seconds'] = parse_time_column_to_seconds(df['duration_raw'], max_parts=3)
     else:
         st.warning("De 'Tijd' kolom is niet gevonden. Duur analyses zijn niet mogelijk.")
         df['duration_seconds'] = 0.0
 
     # Tempo conversie: van MM:SS string naar seconden per eenheid
-    def parse_pace_to_seconds_per_unit(pace_str):
-        if pd.isna(pace_str): return 0
-        try:
-            parts = str(pace_str).split(':')
-            if len(parts) == 2: return int(parts[0]) * 60 + int(parts[1])
-            else: return float(pace_str)
-        except (ValueError, TypeError): return 0
-
     if 'avg_pace_raw' in df.columns:
-        df['avg_pace_sec_per_km'] = df['avg_pace_raw'].apply(parse_pace_to_seconds_per_unit)
+        df['avg_pace_sec_per_km'] = parse_time_column_to_seconds(df['avg_pace_raw'], max_parts=2).astype(np.float32)
     else:
-        df['avg_pace_sec_per_km'] = 0.0
+        df['avg_pace_sec_per_km'] = np.float32(0)
 
     if 'best_pace_raw' in df.columns:
-        df['best_pace_sec_per_km'] = df['best_pace_raw'].apply(parse_pace_to_seconds_per_unit)
+        df['best_pace_sec_per_km'] = parse_time_column_to_seconds(df['best_pace_raw'], max_parts=2).astype(np.float32)
     else:
-        df['best_pace_sec_per_km'] = 0.0
+        df['best_pace_sec_per_km'] = np.float32(0)
 
     # Voeg week- en maandkolommen toe voor aggregatie
-    if 'date' in df.columns and not df['date'].empty and df['date'].notna().any():
-        # Formatteer year_week als 'YYYY-WW' zodat het correct sorteert en weergeeft
-        df['year_week'] = df['date'].dt.strftime('%Y-%W')
-        # Bereken de startdatum van de week voor elke activiteit
-        df['date_week_start'] = df['date'].apply(lambda x: x - timedelta(days=x.weekday()))
-        # Bereken de einddatum van de week
-        df['date_week_end'] = df['date_week_start'] + timedelta(days=6)
-        # Formatteer year_month als 'YYYY-MM'
-        df['year_month'] = df['date'].dt.strftime('%Y-%m')
-    else:
-        df['year_week'] = 'Onbekend'
-        df['year_month'] = 'Onbekend'
-        df['date_week_start'] = pd.NaT
-        df['date_week_end'] = pd.NaT
+    add_period_columns(df)
 
+    # Sorteer op datum, zodat een datumbereik met searchsorted als aaneengesloten blok geselecteerd kan worden
+    df.sort_values('date', inplace=True, ignore_index=True, kind='stable')
 
     return df
 
-def format_duration(seconds):
-    """Formateert een aantal seconden naar HH:MM:SS string."""
-    if pd.isna(seconds) or seconds == 0:
-        return "00:00:00"
-    seconds = int(seconds)
-    hours = seconds // 3600
-    minutes = (seconds % 3600) // 60
-    seconds = seconds % 60
-    return f"{hours:02d}:{minutes:02d}:{seconds:02d}"
+@st.cache_data(show_spinner=False)
+def aggregate_per_day(df):
+    """Totale afstand en duur per dag (gecachet zolang df niet verandert)."""
+    df_daily = df.groupby('day').agg(
+        distance_km=('distance_km', 'sum'),
+        duration_seconds=('duration_seconds', 'sum'),
+    ).reset_index()
+    # float32-sommen terug naar float64 en afronden, zodat de hover bijv. 55.7 toont i.p.v. 55.700001
+    df_daily['distance_km'] = df_daily['distance_km'].astype(np.float64).round(2)
+    df_daily['duration_seconds'] = df_daily['duration_seconds'].astype(np.float64).round(0)
+    df_daily['Tijd (HH:MM:SS)'] = format_duration_column(df_daily['duration_seconds'])
+    return df_daily
+
+@st.cache_data(show_spinner=False)
+def aggregate_per_period(df, period_column):
+    """Totalen en gemiddelden per week of maand (zie export_data.period_aggregates), gecachet per DataFrame en periode."""
+    return period_aggregates(df, period_column)
+
+@st.cache_data(show_spinner=False)
+def build_daily_figures(df_daily_totals):
+    """
+    Bouwt de grafieken 'Afstand over tijd' en 'Duur over tijd' (gecachet zolang de dagtotalen niet veranderen).
+    Bij lange periodes wordt elke reeks eerst uitgedund tot MAX_PLOT_POINTS punten.
+    """
+    fig_distance_time = px.line(
+        downsample_series(df_daily_totals, 'day', 'distance_km'),
+        x='day',
+        y='distance_km',
+        title='Totale Afstand per Dag',
+        labels={'distance_km': 'Afstand (km)', 'day': 'Datum'},
+        template="plotly_dark"
+    )
+    fig_distance_time.update_traces(mode='lines+markers', marker_size=5)
+
+    fig_duration_time = px.line(
+        downsample_series(df_daily_totals, 'day', 'duration_seconds'),
+        x='day',
+        y='duration_seconds',
+        title='Totale Duur per Dag',
+        labels={'duration_seconds': 'Duur (seconden)', 'day': 'Datum'},
+        template="plotly_dark",
+        hover_data={'duration_seconds':False, 'Tijd (HH:MM:SS)':True}
+    )
+    fig_duration_time.update_traces(mode='lines+markers', marker_size=5)
+    return fig_distance_time, fig_duration_time
+
+@st.cache_data(show_spinner=False)
+def build_period_figures(df_agg, aggregation_period, x_label, x_tickangle, show_range_slider):
+    """
+    Bouwt de staafgrafieken van het overzicht per week/maand (gecachet zolang de aggregatie en instellingen niet veranderen).
+    Volgorde: totale afstand, gem. afstand, totale duur, gem. duur, gem. hartslag.
+    """
+    period_label = aggregation_period.lower()
+    # (kolom, titel, as-label, getalnotatie in de hover, tekst op de staaf, kleur)
+    charts = [
+        ('Totaal Afstand (km)', 'Totale Afstand', 'Totaal Afstand (km)', ':.2f', {'texttemplate': '%{y:.2f}'}, '#FF4B4B'),
+        ('Gem. Afstand (km)', 'Gemiddelde Afstand', 'Gemiddelde Afstand (km)', ':.2f', {'texttemplate': '%{y:.2f}'}, '#636EFA'),
+        ('Totale Duur (sec)', 'Totale Duur', 'Totale Duur (seconden)', ':.0f', {'text': df_agg['Totale Duur (HH:MM:SS)'].to_numpy()}, '#00CC96'),
+        ('Gem. Duur (sec)', 'Gemiddelde Duur', 'Gemiddelde Duur (seconden)', ':.0f', {'text': df_agg['Gem. Duur (HH:MM:SS)'].to_numpy()}, '#EF553B'),
+        ('Gem. Hartslag (bpm)', 'Gemiddelde Hartslag', 'Gemiddelde Hartslag (bpm)', ':.0f', {'texttemplate': '%{y:.0f}'}, '#DAA520'), # Hele getallen, gouden kleur
+    ]
+    # De aggregatie staat in chronologische volgorde: eerste en laatste periode één keer opzoeken voor alle grafieken
+    # Plotly krijgt numpy arrays i.p.v. Series: geen extra conversie per trace, en de periodelabels worden één keer
+    # uit de categorie gehaald voor alle vijf de grafieken
+    periods = df_agg['Periode'].to_numpy(dtype=object)
+    period_range = [periods[0], periods[-1]]
+    figures = []
+    for y_column, title, y_label, y_format, text_kwargs, color in charts:
+        # Direct een go.Bar-trace i.p.v. px.bar: Plotly Express hoeft de data dan niet eerst om te vormen
+        fig = go.Figure(go.Bar(
+            x=periods,
+            y=df_agg[y_column].to_numpy(dtype=np.float64), # Ook de (nullable Int64) hartslagkolom als gewone float-array
+            textposition='outside',
+            marker_color=color,
+            hovertemplate=f'{x_label}=%{{x}}<br>{y_label}=%{{y{y_format}}}<extra></extra>',
+            **text_kwargs
+        ))
+        fig.update_layout(
+            title=f'{title} {period_label}',
+            xaxis_title=x_label,
+            yaxis_title=y_label,
+            template="plotly_dark",
+            showlegend=False
+        )
+        update_period_xaxes(fig, aggregation_period, x_tickangle, show_range_slider, period_range)
+        figures.append(fig)
+    return figures
+
+def update_period_xaxes(fig, aggregation_period, x_tickangle, show_range_slider, period_range):
+    """Stelt de x-as van een week- of maandgrafiek in (labels, schuifbalk met periodeknoppen, maandopmaak)."""
+    # Alle instellingen in één update_xaxes, zodat Plotly de as maar één keer valideert
+    xaxes_kwargs = dict(
+        tickangle=x_tickangle,
+        rangeslider_visible=show_range_slider,
+        rangeselector=PERIOD_RANGESELECTOR if show_range_slider else None
+    )
+    # Specifieke aanpassing voor maandweergave in grafiek
+    if aggregation_period == 'Per Maand':
+        xaxes_kwargs.update(
+            tickformat="%Y-%m", # Formatteer als YYYY-MM
+            dtick="M1", # Toon elke maand
+            ticklabelmode="period", # Zorgt voor correcte labels bij de periode
+            # Ensure the last month is visible:
+            range=period_range
+        )
+    fig.update_xaxes(**xaxes_kwargs)
 
 # --- Zijbalk voor bestand uploaden en filters ---
 with st.sidebar:
@@ -162,11 +304,20 @@ with st.sidebar:
 
     uploaded_file = st.file_uploader("Kies een bestand", type=["csv", "xlsx"])
 
+    clear_cache_button(EXPORT_CACHE_DIR, load_and_process_data, 'export_df_key',
+                       "Lees geüploade bestanden opnieuw in i.p.v. de bewaarde verwerkte versie te gebruiken.")
+
     df_full = None
     filtered_df = pd.DataFrame()
 
     if uploaded_file is not None:
-        df_full = load_and_process_data(uploaded_file)
+        # Bewaar het verwerkte bestand in de sessie: reruns door andere widgets hoeven het dan niet opnieuw
+        # te hashen of van schijf te lezen. file_id verandert bij elke nieuwe upload.
+        upload_key = (uploaded_file.name, uploaded_file.size, getattr(uploaded_file, 'file_id', None))
+        if st.session_state.get('export_df_key') != upload_key:
+            st.session_state.export_df = load_data(uploaded_file)
+            st.session_state.export_df_key = upload_key
+        df_full = st.session_state.export_df
         if df_full is not None and not df_full.empty:
             st.success("Bestand succesvol geladen!")
             st.write(f"Totaal {len(df_full)} records gevonden.")
@@ -191,7 +342,10 @@ with st.sidebar:
                 st.error("Fout: De 'Tot' datum moet na of gelijk zijn aan de 'Vanaf' datum.")
                 filtered_df = pd.DataFrame()
             else:
-                filtered_df = df_full[(df_full['date'].dt.date >= start_date) & (df_full['date'].dt.date <= end_date)].copy()
+                # df_full is op datum gesorteerd: zoek de grenzen (t/m het einde van de 'Tot' dag) binair op
+                # en neem het blok daartussen, i.p.v. een vergelijking per rij
+                start_row, end_row = df_full['date'].searchsorted([pd.Timestamp(start_date), pd.Timestamp(end_date) + pd.Timedelta(days=1)])
+                filtered_df = df_full.iloc[start_row:end_row] # Wordt verderop alleen gelezen, dus geen .copy() nodig
 
             # Sla de geselecteerde datums op in session_state voor gebruik in tabs
             st.session_state.start_date_filter = start_date
@@ -200,7 +354,10 @@ with st.sidebar:
             # Activiteittype filter
             st.header("Filter op Activiteittype")
             if 'activity_type' in filtered_df.columns and not filtered_df.empty:
-                all_activity_types = ['Alle'] + sorted(filtered_df['activity_type'].dropna().unique().tolist())
+                # Alleen de typen die in de geselecteerde periode voorkomen: werk op de integer codes van de categorie
+                activity_codes = np.unique(filtered_df['activity_type'].cat.codes.to_numpy())
+                activity_type_options = filtered_df['activity_type'].cat.categories[activity_codes[activity_codes >= 0]]
+                all_activity_types = ['Alle'] + sorted(activity_type_options.tolist())
                 selected_activity_types = st.multiselect(
                     "Selecteer activiteittypen",
                     options=all_activity_types,
@@ -226,11 +383,14 @@ if uploaded_file is not None and not filtered_df.empty:
 
     # --- Sectie: Algemene Overzicht KPI's ---
     st.header("Algemeen Overzicht")
-    total_distance = filtered_df['distance_km'].sum()
-    avg_distance = filtered_df['distance_km'].mean()
-    total_duration_seconds = filtered_df['duration_seconds'].sum()
-    avg_duration_seconds = filtered_df['duration_seconds'].mean()
-    total_calories = filtered_df['calories_kcal'].sum()
+    # Sommen en gemiddelden van de KPI-kolommen in één aggregatie
+    # Optellen in float64: een float32-som verliest bij veel activiteiten precisie
+    kpi_stats = filtered_df[['distance_km', 'duration_seconds', 'calories_kcal']].astype(np.float64).agg(['sum', 'mean'])
+    total_distance = kpi_stats.at['sum', 'distance_km']
+    avg_distance = kpi_stats.at['mean', 'distance_km']
+    total_duration_seconds = kpi_stats.at['sum', 'duration_seconds']
+    avg_duration_seconds = kpi_stats.at['mean', 'duration_seconds']
+    total_calories = kpi_stats.at['sum', 'calories_kcal']
     num_activities = len(filtered_df)
 
     # Gebruik kolommen voor een nette presentatie van KPI's
@@ -249,31 +409,25 @@ if uploaded_file is not None and not filtered_df.empty:
     st.markdown("---")
 
     # --- Tabs voor Gedetailleerde Inzichten ---
-    tab1, tab_new_period_overview, tab5 = st.tabs([
+    view_options = [
         "📊 Afstand & Duur",
         "🗓️ Overzicht per Periode",
         "📋 Ruwe Data"
-    ])
+    ]
+    active_view = select_view(view_options)
 
-    with tab1:
+    if active_view == view_options[0]:
         st.header("Afstand en Duur Overzicht")
         st.markdown("Bekijk hoe je afstand en duur zich ontwikkelen over de tijd.")
 
         col_dist_time, col_dur_time = st.columns(2)
 
+        # Afstand en duur per dag in één (gecachete) groupby voor beide grafieken; ook de figuren zelf zijn gecachet
+        fig_distance_time, fig_duration_time = build_daily_figures(aggregate_per_day(filtered_df))
+
         if 'date' in filtered_df.columns and 'distance_km' in filtered_df.columns and filtered_df['date'].notna().any():
             with col_dist_time:
                 st.subheader("Afstand over tijd")
-                df_daily_distance = filtered_df.groupby('date')['distance_km'].sum().reset_index()
-                fig_distance_time = px.line(
-                    df_daily_distance,
-                    x='date',
-                    y='distance_km',
-                    title='Totale Afstand per Dag',
-                    labels={'distance_km': 'Afstand (km)', 'date': 'Datum'},
-                    template="plotly_dark"
-                )
-                fig_distance_time.update_traces(mode='lines+markers', marker_size=5)
                 st.plotly_chart(fig_distance_time, use_container_width=True)
         else:
             with col_dist_time:
@@ -282,18 +436,6 @@ if uploaded_file is not None and not filtered_df.empty:
         if 'date' in filtered_df.columns and 'duration_seconds' in filtered_df.columns and filtered_df['date'].notna().any():
             with col_dur_time:
                 st.subheader("Duur over tijd")
-                df_daily_duration = filtered_df.groupby('date')['duration_seconds'].sum().reset_index()
-                df_daily_duration['Tijd (HH:MM:SS)'] = df_daily_duration['duration_seconds'].apply(format_duration)
-                fig_duration_time = px.line(
-                    df_daily_duration,
-                    x='date',
-                    y='duration_seconds',
-                    title='Totale Duur per Dag',
-                    labels={'duration_seconds': 'Duur (seconden)', 'date': 'Datum'},
-                    template="plotly_dark",
-                    hover_data={'duration_seconds':False, 'Tijd (HH:MM:SS)':True}
-                )
-                fig_duration_time.update_traces(mode='lines+markers', marker_size=5)
                 st.plotly_chart(fig_duration_time, use_container_width=True)
         else:
             with col_dur_time:
@@ -301,7 +443,7 @@ if uploaded_file is not None and not filtered_df.empty:
 
 
     # NIEUW TABBLAD: Overzicht per Periode
-    with tab_new_period_overview:
+    if active_view == view_options[1]:
         st.header("Overzicht per Week of Maand")
         st.markdown("Kies zelf of je de totale en gemiddelde waarden per **week** of per **maand** wilt bekijken.")
 
@@ -331,125 +473,33 @@ if uploaded_file is not None and not filtered_df.empty:
             'year_week' in filtered_df.columns and filtered_df['year_week'].notna().any() and
             'year_month' in filtered_df.columns and filtered_df['year_month'].notna().any()):
 
+            # Beide periodes delen één (gecachete) aggregatie; alleen de labels en assen verschillen
             if aggregation_period_new_tab == 'Per Week':
-                # Eerst aggregeren op year_week
-                df_agg_new = filtered_df.groupby('year_week').agg(
-                    total_distance=('distance_km', 'sum'),
-                    avg_distance=('distance_km', 'mean'),
-                    total_duration=('duration_seconds', 'sum'),
-                    avg_duration=('duration_seconds', 'mean'),
-                    avg_heart_rate=('avg_heart_rate_bpm', lambda x: x[x > 0].mean()) # Gemiddelde HS, excl. 0-waarden
-                ).reset_index()
-
-                # Daarna de unieke start- en einddatums van de week ophalen en toevoegen
-                # We nemen de min_date_week_start en max_date_week_end per year_week om consistentie te garanderen
-                week_dates = filtered_df.groupby('year_week').agg(
-                    min_date_week_start=('date_week_start', 'min'),
-                    max_date_week_end=('date_week_end', 'max')
-                ).reset_index()
-
-                # Merge de geaggregeerde data met de weekdatums
-                df_agg_new = pd.merge(df_agg_new, week_dates, on='year_week', how='left')
-
-                df_agg_new.columns = ['Periode', 'Totaal Afstand (km)', 'Gem. Afstand (km)', 'Totale Duur (sec)', 'Gem. Duur (sec)', 'Gem. Hartslag (bpm)', 'Datum Week Start', 'Datum Week Einde']
-                df_agg_new['Week Periode'] = df_agg_new['Datum Week Start'].dt.strftime('%d-%m') + ' t/m ' + df_agg_new['Datum Week Einde'].dt.strftime('%d-%m')
-
+                df_agg_new = aggregate_per_period(filtered_df, 'year_week')
                 x_label = 'Jaar-Week (JJJJ-WW)'
                 show_xaxis_range_slider = True
                 x_tickangle = 0 # Horizontale labels voor weken
             else: # Per Maand
-                df_agg_new = filtered_df.groupby('year_month').agg(
-                    total_distance=('distance_km', 'sum'),
-                    avg_distance=('distance_km', 'mean'),
-                    total_duration=('duration_seconds', 'sum'),
-                    avg_duration=('duration_seconds', 'mean'),
-                    avg_heart_rate=('avg_heart_rate_bpm', lambda x: x[x > 0].mean()) # Gemiddelde HS, excl. 0-waarden
-                ).reset_index()
-                df_agg_new.columns = ['Periode', 'Totaal Afstand (km)', 'Gem. Afstand (km)', 'Totale Duur (sec)', 'Gem. Duur (sec)', 'Gem. Hartslag (bpm)']
+                df_agg_new = aggregate_per_period(filtered_df, 'year_month')
                 x_label = 'Jaar-Maand (JJJJ-MM)'
                 show_xaxis_range_slider = False
                 x_tickangle = -45 # Schuine labels voor maanden
 
-
-            # Formatteer duur kolommen voor weergave in zowel grafiek als tabel
-            df_agg_new['Totale Duur (HH:MM:SS)'] = df_agg_new['Totale Duur (sec)'].apply(format_duration)
-            df_agg_new['Gem. Duur (HH:MM:SS)'] = df_agg_new['Gem. Duur (sec)'].apply(format_duration)
-            df_agg_new['Gem. Hartslag (bpm)'] = df_agg_new['Gem. Hartslag (bpm)'].round(0).astype('Int64').fillna(0) # Afronden naar heel getal, NaN naar 0
-
             if display_type == 'Grafiek':
+                # Alle grafieken in één (gecachete) aanroep: zolang de aggregatie niet verandert worden ze niet opnieuw opgebouwd
+                fig_total_dist_new, fig_avg_dist_new, fig_total_dur_new, fig_avg_dur_new, fig_avg_hr_new = build_period_figures(
+                    df_agg_new, aggregation_period_new_tab, x_label, x_tickangle, show_xaxis_range_slider
+                )
+
                 # --- Grafieken voor Totaal en Gemiddeld Afstand ---
                 col_total_dist_new, col_avg_dist_new = st.columns(2)
 
                 with col_total_dist_new:
                     st.subheader(f"Totale Afstand {aggregation_period_new_tab.lower()}")
-                    fig_total_dist_new = px.bar(
-                        df_agg_new,
-                        x='Periode',
-                        y='Totaal Afstand (km)',
-                        title=f'Totale Afstand {aggregation_period_new_tab.lower()}',
-                        labels={'Periode': x_label, 'Totaal Afstand (km)': 'Totaal Afstand (km)'},
-                        template="plotly_dark",
-                        text_auto='.2f'
-                    )
-                    fig_total_dist_new.update_traces(textposition='outside', marker_color='#FF4B4B')
-                    fig_total_dist_new.update_layout(showlegend=False)
-                    fig_total_dist_new.update_xaxes(
-                        tickangle=x_tickangle,
-                        rangeslider_visible=show_xaxis_range_slider,
-                        rangeselector=dict(
-                            buttons=list([
-                                dict(count=1, label="1m", step="month", stepmode="backward"),
-                                dict(count=6, label="6m", step="month", stepmode="backward"),
-                                dict(count=1, label="1j", step="year", stepmode="backward"),
-                                dict(step="all")
-                            ])
-                        ) if show_xaxis_range_slider else None
-                    )
-                    # Specifieke aanpassing voor maandweergave in grafiek
-                    if aggregation_period_new_tab == 'Per Maand':
-                        fig_total_dist_new.update_xaxes(
-                            tickformat="%Y-%m", # Formatteer als YYYY-MM
-                            dtick="M1", # Toon elke maand
-                            ticklabelmode="period", # Zorgt voor correcte labels bij de periode
-                            # Ensure the last month is visible:
-                            range=[df_agg_new['Periode'].min(), df_agg_new['Periode'].max()]
-                        )
                     st.plotly_chart(fig_total_dist_new, use_container_width=True)
 
                 with col_avg_dist_new:
                     st.subheader(f"Gemiddelde Afstand {aggregation_period_new_tab.lower()}")
-                    fig_avg_dist_new = px.bar(
-                        df_agg_new,
-                        x='Periode',
-                        y='Gem. Afstand (km)',
-                        title=f'Gemiddelde Afstand {aggregation_period_new_tab.lower()}',
-                        labels={'Periode': x_label, 'Gem. Afstand (km)': 'Gemiddelde Afstand (km)'},
-                        template="plotly_dark",
-                        text_auto='.2f'
-                    )
-                    fig_avg_dist_new.update_traces(textposition='outside', marker_color='#636EFA')
-                    fig_avg_dist_new.update_layout(showlegend=False)
-                    fig_avg_dist_new.update_xaxes(
-                        tickangle=x_tickangle,
-                        rangeslider_visible=show_xaxis_range_slider,
-                        rangeselector=dict(
-                            buttons=list([
-                                dict(count=1, label="1m", step="month", stepmode="backward"),
-                                dict(count=6, label="6m", step="month", stepmode="backward"),
-                                dict(count=1, label="1j", step="year", stepmode="backward"),
-                                dict(step="all")
-                            ])
-                        ) if show_xaxis_range_slider else None
-                    )
-                    # Specifieke aanpassing voor maandweergave in grafiek
-                    if aggregation_period_new_tab == 'Per Maand':
-                        fig_avg_dist_new.update_xaxes(
-                            tickformat="%Y-%m", # Formatteer als YYYY-MM
-                            dtick="M1", # Toon elke maand
-                            ticklabelmode="period", # Zorgt voor correcte labels bij de periode
-                            # Ensure the last month is visible:
-                            range=[df_agg_new['Periode'].min(), df_agg_new['Periode'].max()]
-                        )
                     st.plotly_chart(fig_avg_dist_new, use_container_width=True)
 
                 # --- Grafieken voor Totaal en Gemiddeld Duur ---
@@ -457,110 +507,15 @@ if uploaded_file is not None and not filtered_df.empty:
 
                 with col_total_dur_new:
                     st.subheader(f"Totale Duur {aggregation_period_new_tab.lower()}")
-                    fig_total_dur_new = px.bar(
-                        df_agg_new,
-                        x='Periode',
-                        y='Totale Duur (sec)',
-                        title=f'Totale Duur {aggregation_period_new_tab.lower()}',
-                        labels={'Periode': x_label, 'Totale Duur (sec)': 'Totale Duur (seconden)'},
-                        template="plotly_dark",
-                        text='Totale Duur (HH:MM:SS)'
-                    )
-                    fig_total_dur_new.update_traces(textposition='outside', marker_color='#00CC96')
-                    fig_total_dur_new.update_layout(showlegend=False)
-                    fig_total_dur_new.update_xaxes(
-                        tickangle=x_tickangle,
-                        rangeslider_visible=show_xaxis_range_slider,
-                        rangeselector=dict(
-                            buttons=list([
-                                dict(count=1, label="1m", step="month", stepmode="backward"),
-                                dict(count=6, label="6m", step="month", stepmode="backward"),
-                                dict(count=1, label="1j", step="year", stepmode="backward"),
-                                dict(step="all")
-                            ])
-                        ) if show_xaxis_range_slider else None
-                    )
-                    # Specifieke aanpassing voor maandweergave in grafiek
-                    if aggregation_period_new_tab == 'Per Maand':
-                        fig_total_dur_new.update_xaxes(
-                            tickformat="%Y-%m", # Formatteer als YYYY-MM
-                            dtick="M1", # Toon elke maand
-                            ticklabelmode="period", # Zorgt voor correcte labels bij de periode
-                            # Ensure the last month is visible:
-                            range=[df_agg_new['Periode'].min(), df_agg_new['Periode'].max()]
-                        )
                     st.plotly_chart(fig_total_dur_new, use_container_width=True)
 
                 with col_avg_dur_new:
                     st.subheader(f"Gemiddelde Duur {aggregation_period_new_tab.lower()}")
-                    fig_avg_dur_new = px.bar(
-                        df_agg_new,
-                        x='Periode',
-                        y='Gem. Duur (sec)',
-                        title=f'Gemiddelde Duur {aggregation_period_new_tab.lower()}',
-                        labels={'Periode': x_label, 'Gem. Duur (sec)': 'Gemiddelde Duur (seconden)'},
-                        template="plotly_dark",
-                        text='Gem. Duur (HH:MM:SS)'
-                    )
-                    fig_avg_dur_new.update_traces(textposition='outside', marker_color='#EF553B')
-                    fig_avg_dur_new.update_layout(showlegend=False)
-                    fig_avg_dur_new.update_xaxes(
-                        tickangle=x_tickangle,
-                        rangeslider_visible=show_xaxis_range_slider,
-                        rangeselector=dict(
-                            buttons=list([
-                                dict(count=1, label="1m", step="month", stepmode="backward"),
-                                dict(count=6, label="6m", step="month", stepmode="backward"),
-                                dict(count=1, label="1j", step="year", stepmode="backward"),
-                                dict(step="all")
-                            ])
-                        ) if show_xaxis_range_slider else None
-                    )
-                    # Specifieke aanpassing voor maandweergave in grafiek
-                    if aggregation_period_new_tab == 'Per Maand':
-                        fig_avg_dur_new.update_xaxes(
-                            tickformat="%Y-%m", # Formatteer als YYYY-MM
-                            dtick="M1", # Toon elke maand
-                            ticklabelmode="period", # Zorgt voor correcte labels bij de periode
-                            # Ensure the last month is visible:
-                            range=[df_agg_new['Periode'].min(), df_agg_new['Periode'].max()]
-                        )
                     st.plotly_chart(fig_avg_dur_new, use_container_width=True)
 
                 # --- Grafiek voor Gemiddelde Hartslag (alleen in grafiekweergave) ---
                 if 'Gem. Hartslag (bpm)' in df_agg_new.columns and df_agg_new['Gem. Hartslag (bpm)'].sum() > 0:
                     st.subheader(f"Gemiddelde Hartslag {aggregation_period_new_tab.lower()}")
-                    fig_avg_hr_new = px.bar(
-                        df_agg_new,
-                        x='Periode',
-                        y='Gem. Hartslag (bpm)',
-                        title=f'Gemiddelde Hartslag {aggregation_period_new_tab.lower()}',
-                        labels={'Periode': x_label, 'Gem. Hartslag (bpm)': 'Gemiddelde Hartslag (bpm)'},
-                        template="plotly_dark",
-                        text_auto='.0f' # Toont hele getallen
-                    )
-                    fig_avg_hr_new.update_traces(textposition='outside', marker_color='#DAA520') # Gouden kleur
-                    fig_avg_hr_new.update_layout(showlegend=False)
-                    fig_avg_hr_new.update_xaxes(
-                        tickangle=x_tickangle,
-                        rangeslider_visible=show_xaxis_range_slider,
-                        rangeselector=dict(
-                            buttons=list([
-                                dict(count=1, label="1m", step="month", stepmode="backward"),
-                                dict(count=6, label="6m", step="month", stepmode="backward"),
-                                dict(count=1, label="1j", step="year", stepmode="backward"),
-                                dict(step="all")
-                            ])
-                        ) if show_xaxis_range_slider else None
-                    )
-                    if aggregation_period_new_tab == 'Per Maand':
-                        fig_avg_hr_new.update_xaxes(
-                            tickformat="%Y-%m", # Formatteer als YYYY-MM
-                            dtick="M1", # Toon elke maand
-                            ticklabelmode="period", # Zorgt voor correcte labels bij de periode
-                            # Ensure the last month is visible:
-                            range=[df_agg_new['Periode'].min(), df_agg_new['Periode'].max()]
-                        )
                     st.plotly_chart(fig_avg_hr_new, use_container_width=True)
                 else:
                     st.info("Niet genoeg hartslagdata om de grafiek te tonen.")
@@ -569,14 +524,15 @@ if uploaded_file is not None and not filtered_df.empty:
                 st.subheader(f"Overzichtstabel {aggregation_period_new_tab.lower()}")
 
                 # Selecteer kolommen voor de tabelweergave, inclusief 'Week Periode' indien van toepassing
+                # (alleen gelezen door de tabel en de download, dus geen .copy() nodig)
                 if aggregation_period_new_tab == 'Per Week':
-                    df_agg_new_display = df_agg_new[['Periode', 'Week Periode', 'Totaal Afstand (km)', 'Gem. Afstand (km)', 'Totale Duur (HH:MM:SS)', 'Gem. Duur (HH:MM:SS)', 'Gem. Hartslag (bpm)']].copy()
+                    df_agg_new_display = df_agg_new[['Periode', 'Week Periode', 'Totaal Afstand (km)', 'Gem. Afstand (km)', 'Totale Duur (HH:MM:SS)', 'Gem. Duur (HH:MM:SS)', 'Gem. Hartslag (bpm)']]
                 else: # Per Maand
-                    df_agg_new_display = df_agg_new[['Periode', 'Totaal Afstand (km)', 'Gem. Afstand (km)', 'Totale Duur (HH:MM:SS)', 'Gem. Duur (HH:MM:SS)', 'Gem. Hartslag (bpm)']].copy()
+                    df_agg_new_display = df_agg_new[['Periode', 'Totaal Afstand (km)', 'Gem. Afstand (km)', 'Totale Duur (HH:MM:SS)', 'Gem. Duur (HH:MM:SS)', 'Gem. Hartslag (bpm)']]
 
                 st.dataframe(df_agg_new_display, use_container_width=True)
 
-                csv_export_agg = df_agg_new_display.to_csv(index=False).encode('utf-8')
+                csv_export_agg = to_csv_bytes(df_agg_new_display)
                 st.download_button(
                     label=f"Download {aggregation_period_new_tab.lower()} overzicht als CSV",
                     data=csv_export_agg,
@@ -588,12 +544,12 @@ if uploaded_file is not None and not filtered_df.empty:
             st.info("Niet genoeg data (afstand, duur, hartslag of geldige datums/periodes) om het overzicht te tonen voor de geselecteerde filters.")
 
 
-    with tab5: # Ruwe Data tab
+    if active_view == view_options[2]: # Ruwe Data
         st.header("Ruwe Gegevens")
         st.markdown("Hier kun je de gefilterde ruwe data bekijken en eventueel exporteren.")
-        st.dataframe(filtered_df)
+        show_paginated_dataframe(filtered_df, page_size=1000, use_container_width=True, hide_index=True)
 
-        csv_export = filtered_df.to_csv(index=False).encode('utf-8')
+        csv_export = to_csv_bytes(filtered_df)
         st.download_button(
             label="Download gefilterde data als CSV",
             data=csv_export,
@@ -0,0 +1,143 @@
+import pandas as pd
+import numpy as np
+from datetime import time, timedelta
+from utils import format_duration_column
+
+# Deze module bevat de verwerking van de Garmin-export voor dashboard.py zonder Streamlit-aanroepen,
+# zodat de functies ook los (bijv. in de tests) gebruikt kunnen worden.
+
+# Maximaal aantal punten per lijn in de dagelijkse grafieken; langere reeksen worden met LTTB uitgedund
+MAX_PLOT_POINTS = 2000
+
+def time_cell_to_seconds(value):
+    """Aantal seconden van een Excel-tijdcel (datetime.time of timedelta/pd.Timedelta), anders NaN."""
+    if isinstance(value, timedelta):
+        return value.total_seconds()
+    if isinstance(value, time):
+        return value.hour * 3600 + value.minute * 60 + value.second + value.microsecond / 1e6
+    return np.nan
+
+def parse_time_column_to_seconds(values, max_parts):
+    """
+    Zet een kolom met 'HH:MM:SS' / 'MM:SS' teksten (of losse getallen) in één keer om naar seconden.
+    Waarden met meer dan max_parts delen, lege en ongeldige waarden worden 0.
+    Tijd- en duurcellen uit Excel (datetime.time, timedelta) worden direct omgerekend.
+    """
+    if pd.api.types.is_timedelta64_dtype(values):
+        return values.dt.total_seconds().fillna(0)
+    cell_seconds = None
+    if values.dtype == object:
+        # Excel-lezers (calamine, openpyxl) geven tijdcellen als objecten; als tekst ('0 days 01:02:03') zouden ze op 0 uitkomen
+        cell_seconds = pd.Series([time_cell_to_seconds(value) for value in values], index=values.index, dtype=float)
+        values = values.where(cell_seconds.isna())
+
+    parts = values.astype(str).str.split(':', expand=True)
+    n_parts = parts.notna().sum(axis=1).to_numpy()
+    numbers = [pd.to_numeric(parts[i], errors='coerce').to_numpy(dtype=float) for i in range(min(parts.shape[1], 3))]
+    numbers += [np.full(len(values), np.nan)] * (3 - len(numbers))
+
+    conditions = [n_parts == 1, n_parts == 2]
+    choices = [numbers[0], numbers[0] * 60 + numbers[1]]
+    if max_parts >= 3:
+        conditions.append(n_parts == 3)
+        choices.append(numbers[0] * 3600 + numbers[1] * 60 + numbers[2])
+    seconds = pd.Series(np.select(conditions, choices, default=np.nan), index=values.index)
+    if cell_seconds is not None:
+        seconds = cell_seconds.fillna(seconds)
+    return seconds.fillna(0)
+
+def add_period_columns(df):
+    """
+    Voegt de week- en maandkolommen voor de aggregatie toe aan df (in place): 'year_week' ('YYYY-WW', weeknummer
+    van de maandag), 'year_month' ('YYYY-MM') en de start- en einddatum van de week.
+    """
+    if 'date' in df.columns and not df['date'].empty and df['date'].notna().any():
+        # Reken met periodes (gehele getallen) i.p.v. per rij strftime; weken lopen van maandag t/m zondag
+        week_periods = df['date'].dt.to_period('W-SUN')
+        # Bereken de start- en einddatum van de week voor elke activiteit
+        df['date_week_start'] = week_periods.dt.start_time
+        df['date_week_end'] = df['date_week_start'] + timedelta(days=6)
+        # Labels 'YYYY-WW' (weeknummer van de maandag) en 'YYYY-MM' worden alleen per unieke week/maand opgemaakt
+        # en als geordende categorie opgeslagen, in chronologische volgorde zodat het correct sorteert en weergeeft (ook min/max)
+        week_codes, unique_weeks = pd.factorize(week_periods, sort=True)
+        df['year_week'] = pd.Categorical.from_codes(week_codes, categories=unique_weeks.start_time.strftime('%Y-%W'), ordered=True)
+        month_codes, unique_months = pd.factorize(df['date'].dt.to_period('M'), sort=True)
+        df['year_month'] = pd.Categorical.from_codes(month_codes, categories=unique_months.strftime('%Y-%m'), ordered=True)
+    else:
+        df['year_week'] = 'Onbekend'
+        df['year_month'] = 'Onbekend'
+        df['date_week_start'] = pd.NaT
+        df['date_week_end'] = pd.NaT
+
+def period_aggregates(df, period_column):
+    """
+    Totalen en gemiddelden per week ('year_week') of maand ('year_month').
+    Per week komen ook de start- en einddatum van de week mee, in dezelfde groupby.
+    """
+    # Een hartslag van 0 betekent 'niet gemeten': als NaN telt die niet mee in 'mean'
+    period_source = pd.DataFrame({
+        period_column: df[period_column],
+        'distance_km': df['distance_km'],
+        'duration_seconds': df['duration_seconds'],
+        '_hr_pos': df['avg_heart_rate_bpm'].where(df['avg_heart_rate_bpm'] > 0),
+    })
+    aggregations = {
+        'Totaal Afstand (km)': ('distance_km', 'sum'),
+        'Gem. Afstand (km)': ('distance_km', 'mean'),
+        'Totale Duur (sec)': ('duration_seconds', 'sum'),
+        'Gem. Duur (sec)': ('duration_seconds', 'mean'),
+        'Gem. Hartslag (bpm)': ('_hr_pos', 'mean'), # Gemiddelde HS, excl. 0-waarden
+    }
+    if period_column == 'year_week':
+        # We nemen de vroegste weekstart en laatste weekeinde per year_week om consistentie te garanderen
+        period_source['date_week_start'] = df['date_week_start']
+        period_source['date_week_end'] = df['date_week_end']
+        aggregations['Datum Week Start'] = ('date_week_start', 'min')
+        aggregations['Datum Week Einde'] = ('date_week_end', 'max')
+
+    df_agg = period_source.groupby(period_column, observed=True).agg(**aggregations).reset_index()
+    df_agg.rename(columns={period_column: 'Periode'}, inplace=True)
+    # Terug naar float64 en afronden: de float32-sommen en -gemiddelden (bijv. 55.700001) verschijnen anders zo in tabel en hover
+    distance_columns = ['Totaal Afstand (km)', 'Gem. Afstand (km)']
+    duration_columns = ['Totale Duur (sec)', 'Gem. Duur (sec)']
+    df_agg[distance_columns] = df_agg[distance_columns].astype(np.float64).round(2)
+    df_agg[duration_columns] = df_agg[duration_columns].astype(np.float64).round(0)
+    if period_column == 'year_week':
+        df_agg['Week Periode'] = df_agg['Datum Week Start'].dt.strftime('%d-%m') + ' t/m ' + df_agg['Datum Week Einde'].dt.strftime('%d-%m')
+
+    # Formatteer duur kolommen voor weergave in zowel grafiek als tabel
+    df_agg['Totale Duur (HH:MM:SS)'] = format_duration_column(df_agg['Totale Duur (sec)'])
+    df_agg['Gem. Duur (HH:MM:SS)'] = format_duration_column(df_agg['Gem. Duur (sec)'])
+    df_agg['Gem. Hartslag (bpm)'] = df_agg['Gem. Hartslag (bpm)'].round(0).astype('Int64').fillna(0) # Afronden naar heel getal, NaN naar 0
+    return df_agg
+
+def lttb_indices(x, y, n_out):
+    """
+    Kiest n_out punten volgens Largest-Triangle-Three-Buckets: per bucket het punt dat met het vorige gekozen punt
+    en het gemiddelde van de volgende bucket de grootste driehoek vormt. Het eerste en laatste punt blijven behouden.
+    """
+    n = len(x)
+    if n <= n_out or n_out < 3:
+        return np.arange(n)
+    # Grenzen van de n_out - 2 middelste buckets, plus het laatste punt als 'volgende bucket' van de laatste
+    edges = np.append(np.linspace(1, n - 1, n_out - 1).astype(np.int64), n)
+    selected = np.empty(n_out, dtype=np.int64)
+    selected[0], selected[-1] = 0, n - 1
+    previous = 0
+    for i in range(n_out - 2):
+        start, end = edges[i], edges[i + 1]
+        next_x = x[end:edges[i + 2]].mean()
+        next_y = y[end:edges[i + 2]].mean()
+        # Dubbele oppervlakte van de driehoek (vorig punt, kandidaat, gemiddelde volgende bucket) voor de hele bucket tegelijk
+        areas = np.abs((x[previous] - next_x) * (y[start:end] - y[previous]) - (x[previous] - x[start:end]) * (next_y - y[previous]))
+        previous = start + int(np.argmax(areas))
+        selected[i + 1] = previous
+    return selected
+
+def downsample_series(df, x_column, y_column, max_points=MAX_PLOT_POINTS):
+    """Dunt een tijdreeks uit tot max_points rijen met LTTB, zodat pieken en dalen zichtbaar blijven."""
+    if len(df) <= max_points:
+        return df
+    x = df[x_column].to_numpy(dtype='datetime64[ns]').astype(np.int64).astype(np.float64)
+    y = df[y_column].to_numpy(dtype=np.float64)
+    return df.iloc[lttb_indices(x, y, max_points)]
@@ -0,0 +1,432 @@
+import pandas as pd
+import numpy as np
+from fitparse import FitFile
+from fitparse.profile import FIELD_TYPES, MESSAGE_TYPES
+from fitparse.records import Crc
+from collections import defaultdict
+import struct
+import os
+from utils import atomic_pickle_dump
+
+# Deze module bevat het parsen van FIT-bestanden zonder Streamlit-aanroepen,
+# zodat de functies ook in aparte processen (ProcessPoolExecutor) kunnen draaien.
+
+# 1 semicircle = 180 / 2^31 graden
+SEMI_TO_DEG = 180.0 / 2147483648.0
+
+# Kolommen uit de 'record' berichten die het dashboard gebruikt; de rest wordt direct verwijderd
+KEEP_COLUMNS = {
+    'DatumTijd', 'Latitude', 'Longitude', 'Afstand_m', 'Afstand_km', 'Hartslag_bpm',
+    'Cadans_rpm', 'Snelheid_ms', 'Snelheid_kmh', 'Hoogte_m', 'Vermogen_watts',
+}
+
+# --- Snelle FIT decoder ---
+# Decodeert alleen de 'record' en 'session' velden die het dashboard gebruikt, rechtstreeks uit de bytes.
+# Alle 'record' berichten met dezelfde definitie worden in één keer met numpy omgezet naar kolommen.
+# Bestanden met iets wat deze decoder niet ondersteunt worden via fitparse gelezen.
+
+RECORD_MESG_NUM = 20
+SESSION_MESG_NUM = 18
+TIMESTAMP_FIELD_NUM = 253
+FIT_EPOCH_OFFSET = 631065600 # Seconden tussen 1970-01-01 en 1989-12-31 (FIT referentietijd)
+MIN_ABSOLUTE_TIMESTAMP = 0x10000000 # Kleinere waarden zijn relatieve (systeem)tijden
+
+# Veldnummers -> veldnamen (zoals fitparse ze noemt) voor de gebruikte velden
+RECORD_FIELDS = {
+    253: 'timestamp', 0: 'position_lat', 1: 'position_long', 2: 'altitude', 3: 'heart_rate',
+    4: 'cadence', 5: 'distance', 6: 'speed', 7: 'power',
+}
+SESSION_FIELDS = {5: 'sport', 11: 'total_calories', 15: 'max_speed', 22: 'total_ascent'}
+
+# Velden waarvan fitparse componenten uitpakt naar de gebruikte kolommen (bijv. oude toestellen)
+UNSUPPORTED_RECORD_FIELDS = {8} # compressed_speed_distance
+
+# FIT base type -> (struct/numpy formaatcode, ongeldige waarde); alleen gehele getallen worden ondersteund
+BASE_TYPES = {
+    0x00: ('B', 0xFF), 0x01: ('b', 0x7F), 0x02: ('B', 0xFF), 0x83: ('h', 0x7FFF),
+    0x84: ('H', 0xFFFF), 0x85: ('i', 0x7FFFFFFF), 0x86: ('I', 0xFFFFFFFF), 0x0A: ('B', 0x00),
+    0x8B: ('H', 0x0000), 0x8C: ('I', 0x00000000), 0x0D: ('B', 0xFF), 0x8E: ('q', 0x7FFFFFFFFFFFFFFF),
+    0x8F: ('Q', 0xFFFFFFFFFFFFFFFF), 0x90: ('Q', 0x0000000000000000),
+}
+
+class UnsupportedFitData(Exception):
+    """Het bestand bevat iets wat de snelle decoder niet ondersteunt; gebruik fitparse."""
+
+class _MessageDefinition:
+    """Een FIT definitiebericht: veldposities binnen de bijbehorende databerichten."""
+
+    def __init__(self, mesg_num, endian, field_defs, dev_data_size):
+        self.mesg_num = mesg_num
+        self.endian = endian
+        self.size = sum(size for _, size, _ in field_defs) + dev_data_size
+        self.fields = {} # veldnummer -> (offset, grootte, base type); bij dubbele nummers wint de laatste
+        offset = 0
+        for field_num, size, base_type in field_defs:
+            self.fields[field_num] = (offset, size, base_type)
+            offset += size
+        self.timestamp = self._scalar_field(TIMESTAMP_FIELD_NUM)
+        # Posities (in de bytes) en volgnummers van de 'record' berichten met deze definitie
+        self.record_positions = []
+        self.record_indices = []
+
+    def _scalar_field(self, field_num):
+        """Geeft (offset, struct.Struct, ongeldige waarde) voor een enkelvoudig geheel getal, of None."""
+        if field_num not in self.fields:
+            return None
+        offset, size, base_type = self.fields[field_num]
+        if base_type not in BASE_TYPES or struct.calcsize(BASE_TYPES[base_type][0]) != size:
+            raise UnsupportedFitData(f"Veld {field_num} heeft een niet-ondersteund formaat")
+        fmt, invalid = BASE_TYPES[base_type]
+        return offset, struct.Struct(self.endian + fmt), invalid
+
+    def read_scalar(self, data, position, field):
+        offset, unpacker, invalid = field
+        value = unpacker.unpack_from(data, position + offset)[0]
+        return None if value == invalid else value
+
+def _decode_fit_fast(data):
+    """
+    Decodeert de 'record' en de eerste 'session' berichten uit FIT-bytes.
+    Geeft (kolommen, sessiewaarden) terug: kolommen is een dict veldnaam -> numpy array.
+    """
+    header_size = data[0]
+    if len(data) < 12 or data[8:12] != b'.FIT':
+        raise UnsupportedFitData("Geen geldige FIT-header")
+    data_size = struct.unpack_from('<I', data, 4)[0]
+    end = header_size + data_size
+    # Controleer de CRC over header en data, net als fitparse; bij een beschadigd of afgekapt bestand
+    # leest fitparse het opnieuw en meldt de fout
+    if len(data) < end + 2 or struct.unpack_from('<H', data, end)[0] != Crc.calculate(data[:end]):
+        raise UnsupportedFitData("CRC van het bestand klopt niet")
+    if len(data) > end + 2:
+        # Meerdere aan elkaar gekoppelde FIT-bestanden (chained): fitparse leest alle delen
+        raise UnsupportedFitData("Meerdere FIT-bestanden achter elkaar")
+
+    definitions = {} # lokaal berichtnummer -> _MessageDefinition
+    record_definitions = []
+    record_timestamps = []
+    session_values = None
+    last_timestamp = 0
+    position = header_size
+    while position < end:
+        header = data[position]
+        position += 1
+        time_offset = None
+        if header & 0x80: # Compressed timestamp header
+            definition = definitions[(header >> 5) & 0x03]
+            time_offset = header & 0x1F
+        elif header & 0x40: # Definitiebericht
+            endian = '>' if data[position + 1] else '<'
+            mesg_num, n_fields = struct.unpack_from(endian + 'HB', data, position + 2)
+            position += 5
+            field_defs = [tuple(data[position + 3 * i:position + 3 * i + 3]) for i in range(n_fields)]
+            position += 3 * n_fields
+            dev_data_size = 0
+            if header & 0x20: # Developer velden: alleen de grootte is nodig om ze over te slaan
+                n_dev_fields = data[position]
+                dev_data_size = sum(data[position + 2 + 3 * i] for i in range(n_dev_fields))
+                position += 1 + 3 * n_dev_fields
+            definition = _MessageDefinition(mesg_num, endian, field_defs, dev_data_size)
+            if mesg_num == RECORD_MESG_NUM:
+                if UNSUPPORTED_RECORD_FIELDS & definition.fields.keys():
+                    raise UnsupportedFitData("Record met gecomprimeerde snelheid/afstand")
+                definition.record_fields = {
+                    RECORD_FIELDS[num]: definition._scalar_field(num)
+                    for num in RECORD_FIELDS if num in definition.fields and num != TIMESTAMP_FIELD_NUM
+                }
+                record_definitions.append(definition)
+            definitions[header & 0x0F] = definition
+            continue
+        else: # Databericht met normale header
+            definition = definitions[header & 0x0F]
+
+        if position + definition.size > end:
+            raise UnsupportedFitData("Onvolledig databericht")
+
+        # Houd de laatste tijdstempel bij voor berichten met een compressed timestamp header
+        timestamp = None
+        if definition.timestamp is not None:
+            timestamp = definition.read_scalar(data, position, definition.timestamp)
+            if timestamp is not None:
+                last_timestamp = timestamp
+        if time_offset is not None:
+            last_timestamp += (time_offset - last_timestamp) & 0x1F
+            timestamp = last_timestamp
+
+        if definition.mesg_num == RECORD_MESG_NUM:
+            definition.record_positions.append(position)
+            definition.record_indices.append(len(record_timestamps))
+            record_timestamps.append(-1 if timestamp is None else timestamp)
+        elif definition.mesg_num == SESSION_MESG_NUM and session_values is None:
+            session_values = {}
+            for field_num, name in SESSION_FIELDS.items():
+                value = definition.read_scalar(data, position, definition._scalar_field(field_num)) if field_num in definition.fields else None
+                if value is not None:
+                    session_values[name] = value
+
+        position += definition.size
+
+    n_records = len(record_timestamps)
+    columns = {}
+
+    # Tijdstempels: FIT-seconden -> datetime64 (NaT voor ontbrekende of relatieve tijden)
+    if any(timestamp >= 0 for timestamp in record_timestamps):
+        raw_timestamps = np.array(record_timestamps, dtype=np.int64)
+        timestamps = (raw_timestamps + FIT_EPOCH_OFFSET).astype('datetime64[s]').astype('datetime64[ns]')
+        timestamps[raw_timestamps < MIN_ABSOLUTE_TIMESTAMP] = np.datetime64('NaT')
+        columns['timestamp'] = timestamps
+
+    # Overige velden: per definitie alle berichten tegelijk decoderen via een numpy structured dtype
+    all_bytes = np.frombuffer(data, dtype=np.uint8)
+    record_profile = MESSAGE_TYPES[RECORD_MESG_NUM].fields
+    for definition in record_definitions:
+        if not definition.record_positions or not definition.record_fields:
+            continue
+        names = list(definition.record_fields)
+        dtype = np.dtype({
+            'names': names,
+            'formats': [definition.endian + definition.record_fields[name][1].format[-1] for name in names],
+            'offsets': [definition.record_fields[name][0] for name in names],
+            'itemsize': definition.size,
+        })
+        positions = np.asarray(definition.record_positions, dtype=np.int64)
+        rows = np.asarray(definition.record_indices, dtype=np.int64)
+        block = all_bytes[positions[:, None] + np.arange(definition.size)]
+        decoded = block.view(dtype)[:, 0]
+        for name in names:
+            raw = decoded[name]
+            values = raw.astype(np.float64)
+            values[raw == definition.record_fields[name][2]] = np.nan
+            field_profile = next(f for num, f in record_profile.items() if RECORD_FIELDS.get(num) == name)
+            if field_profile.scale:
+                values /= field_profile.scale
+            if field_profile.offset:
+                values -= field_profile.offset
+            if name not in columns:
+                columns[name] = np.full(n_records, np.nan)
+            columns[name][rows] = values
+
+    if session_values is not None:
+        if 'sport' in session_values:
+            session_values['sport'] = FIELD_TYPES['sport'].values.get(session_values['sport'], session_values['sport'])
+        if 'max_speed' in session_values:
+            session_values['max_speed'] /= MESSAGE_TYPES[SESSION_MESG_NUM].fields[15].scale
+
+    return columns, session_values or {}
+
+def _decode_fit_fitparse(data):
+    """Leest de 'record' en eerste 'session' berichten via fitparse (trager, maar ondersteunt alles)."""
+    fit_file = FitFile(data)
+
+    # Lees 'record' en 'session' berichten in één doorgang door het bestand
+    # Bouw de record data kolomsgewijs op i.p.v. een dict per record
+    # Alleen de velden die het dashboard gebruikt worden verzameld
+    record_field_names = set(RECORD_FIELDS.values())
+    columns = defaultdict(list)
+    n_records = 0
+    session_values = None
+    for message in fit_file.get_messages(('record', 'session')):
+        if message.name == 'session':
+            if session_values is None: # Take the first found session, usually one session per file for an activity
+                session_values = {field.name: field.value for field in message.fields
+                                  if field.name in SESSION_FIELDS.values() and field.value is not None}
+            continue
+
+        for field in message.fields:
+            if field.name not in record_field_names:
+                continue
+            column = columns[field.name]
+            if len(column) > n_records:
+                column[n_records] = field.value # Dubbele veldnaam: laatste waarde wint
+            else:
+                column.extend([None] * (n_records - len(column))) # Ontbrekende waarden aanvullen
+                column.append(field.value)
+        n_records += 1
+
+    for column in columns.values():
+        column.extend([None] * (n_records - len(column)))
+
+    return columns, session_values or {}
+
+def parse_fit_bytes(file_bytes, activity_id):
+    """
+    Parses a .fit file from bytes (or a file-like object) and extracts relevant activity data.
+    Returns a DataFrame with key metrics; raises ValueError if the file has no timestamps.
+    """
+    if hasattr(file_bytes, 'getvalue'):
+        data = file_bytes.getvalue()
+    elif hasattr(file_bytes, 'read'):
+        data = file_bytes.read()
+    else:
+        data = bytes(file_bytes)
+
+    try:
+        columns, session_values = _decode_fit_fast(data)
+    except (UnsupportedFitData, struct.error, KeyError, IndexError):
+        # Fall back to fitparse for anything the fast decoder does not handle or cannot read
+        # (unsupported fields, CRC mismatch, truncated or malformed messages); fitparse also reports the real error
+        columns, session_values = _decode_fit_fitparse(data)
+
+    df = pd.DataFrame(columns)
+
+    # Rename common columns to a standardized format
+    column_renames = {
+        'timestamp': 'DatumTijd',
+        'position_lat': 'Latitude_semicircles', # Raw format from FIT
+        'position_long': 'Longitude_semicircles', # Raw format from FIT
+        'distance': 'Afstand_m',
+        'heart_rate': 'Hartslag_bpm',
+        'cadence': 'Cadans_rpm', # or spm for running
+        'speed': 'Snelheid_ms', # meters/second
+        'altitude': 'Hoogte_m',
+        'power': 'Vermogen_watts',
+    }
+    df.rename(columns=column_renames, inplace=True)
+
+    # Convert raw semicircles GPS to degrees (missing values become NaN)
+    # The multiply writes straight into the final float32 array: no float64 temporary and no separate drop
+    if 'Latitude_semicircles' in df.columns and 'Longitude_semicircles' in df.columns:
+        for source, target in [('Latitude_semicircles', 'Latitude'), ('Longitude_semicircles', 'Longitude')]:
+            semicircles = df.pop(source).to_numpy(dtype=np.float64, na_value=np.nan)
+            degrees = np.empty(len(semicircles), dtype=np.float32)
+            np.multiply(semicircles, SEMI_TO_DEG, out=degrees, casting='same_kind')
+            df[target] = degrees
+    else:
+        df['Latitude'] = pd.NA
+        df['Longitude'] = pd.NA
+
+    # Convert to more readable units
+    if 'Afstand_m' in df.columns:
+        df['Afstand_km'] = df['Afstand_m'] / 1000
+    else:
+        df['Afstand_km'] = 0.0
+
+    if 'Snelheid_ms' in df.columns:
+        df['Snelheid_kmh'] = df['Snelheid_ms'] * 3.6
+    else:
+        df['Snelheid_kmh'] = 0.0
+
+    # Drop fields the dashboard never shows (temperature, enhanced_* duplicates, ...)
+    df = df[[column for column in df.columns if column in KEEP_COLUMNS]]
+
+    # Ensure datetime column is correct
+    if 'DatumTijd' in df.columns:
+        # fitparse already yields datetime objects; only parse (with a fixed ISO format) when needed
+        if not pd.api.types.is_datetime64_dtype(df['DatumTijd']):
+            df['DatumTijd'] = pd.to_datetime(df['DatumTijd'], format='ISO8601', errors='coerce', utc=True).dt.tz_convert(None)
+        df.dropna(subset=['DatumTijd'], inplace=True) # Drop rows where datetime is invalid
+        df = df.sort_values(by='DatumTijd').reset_index(drop=True)
+        # Seconden sinds de start passen ruim in float32 (exact tot ~194 dagen)
+        df['Tijd_sec'] = (df['DatumTijd'] - df['DatumTijd'].iloc[0]).dt.total_seconds().astype(np.float32)
+    else:
+        raise ValueError("Geen 'timestamp' data gevonden in het FIT-bestand. Kan geen dashboard genereren.")
+
+    # Downcast the sensor channels to float32: halves memory for the combined DataFrame.
+    # Float32 (instead of Int16 for heart rate/cadence/power) keeps NaN for missing samples.
+    for column in ['Hartslag_bpm', 'Cadans_rpm', 'Vermogen_watts', 'Afstand_m', 'Afstand_km',
+                   'Snelheid_ms', 'Snelheid_kmh', 'Hoogte_m', 'Latitude', 'Longitude']:
+        if column in df.columns:
+            df[column] = pd.to_numeric(df[column], errors='coerce').astype(np.float32)
+
+    # Add the unique activity ID to the DataFrame
+    df['Activity_ID'] = activity_id
+
+    # --- Extract Session/Activity Summary Data (for KPIs) ---
+    # Values of the first session message (collected above); missing or invalid fields fall back to the defaults
+    activity_type = str(session_values.get('sport', 'Onbekend')).replace('_', ' ').title()
+    session_calories = session_values.get('total_calories', 0)
+    session_max_speed_kmh = session_values.get('max_speed', 0) * 3.6 # Convert m/s to km/h
+    session_total_elevation_gain_m = session_values.get('total_ascent', 0)
+
+    # Keep the session-level totals once per activity in df.attrs instead of repeating them on every row
+    # (summing a repeated column would count them once per record); the app combines them into one sessions table
+    df['Activiteitstype'] = activity_type
+    df.attrs['session'] = {
+        'Activity_ID': activity_id,
+        'Activiteitstype': activity_type,
+        'Totale_Calorieën': session_calories,
+        'Max_Snelheid_Activiteit': session_max_speed_kmh,
+        'Totale_Stijging_Meters': session_total_elevation_gain_m,
+    }
+
+    # Activity_ID and Activiteitstype repeat the same string on every row: store them as categories
+    df['Activity_ID'] = df['Activity_ID'].astype('category')
+    df['Activiteitstype'] = df['Activiteitstype'].astype('category')
+
+    return df
+
+def parse_fit_job(job):
+    """
+    Worker voor ProcessPoolExecutor: job is een tuple (file_bytes, activity_id).
+    Geeft (DataFrame, foutmelding) terug; foutmelding is None als het parsen gelukt is.
+    """
+    file_bytes, activity_id = job
+    try:
+        return parse_fit_bytes(file_bytes, activity_id), None
+    except Exception as e:
+        return pd.DataFrame(), str(e)
+
+def combine_activity_frames(frames):
+    """
+    Plakt de geparste DataFrames onder elkaar: per kolom één array van de totale lengte die per bestand gevuld wordt.
+    Ontbrekende kolommen worden NaN/NaT; categoriekolommen krijgen de vereniging van alle categorieën.
+    """
+    total_rows = sum(len(frame) for frame in frames)
+    column_names = list(dict.fromkeys(column for frame in frames for column in frame.columns))
+    starts = np.cumsum([0] + [len(frame) for frame in frames])
+    combined = {}
+    for column in column_names:
+        parts = [frame[column] if column in frame.columns else None for frame in frames]
+        present = [part for part in parts if part is not None]
+        if isinstance(present[0].dtype, pd.CategoricalDtype):
+            categories = pd.Index(list(dict.fromkeys(value for part in present for value in part.cat.categories)))
+            codes = np.full(total_rows, -1, dtype=np.int32)
+            for start, part in zip(starts, parts):
+                if part is not None:
+                    # Hercodeer naar de gezamenlijke categorieën; code -1 (ontbrekend) blijft -1
+                    recode = np.append(categories.get_indexer(part.cat.categories), -1)
+                    codes[start:start + len(part)] = recode[part.cat.codes.to_numpy()]
+            combined[column] = pd.Categorical.from_codes(codes, categories=categories)
+            continue
+        dtype = np.result_type(*[part.dtype for part in present])
+        if len(present) < len(parts) and dtype.kind in 'biu':
+            dtype = np.dtype(np.float64) # Ruimte voor NaN bij bestanden zonder deze kolom
+        values = np.empty(total_rows, dtype=dtype)
+        for frame, start, part in zip(frames, starts, parts):
+            if part is None:
+                values[start:start + len(frame)] = np.datetime64('NaT') if dtype.kind == 'M' else np.nan
+            else:
+                values[start:start + len(frame)] = part.to_numpy()
+        combined[column] = values
+    return pd.DataFrame(combined, copy=False)
+
+# --- Schijfcache van geparste bestanden ---
+# Het parsen gebeurt één keer per bestandsinhoud; ook na een herlaadactie of in een nieuwe sessie
+# wordt het DataFrame daarna direct van schijf geladen.
+# Pickle i.p.v. feather/parquet: df.attrs (de sessietotalen) en de category- en float32-kolommen komen
+# zo ongewijzigd terug, zonder omzetting via Arrow.
+
+# Verhoog dit nummer als de uitvoer van parse_fit_bytes verandert, zodat oude cachebestanden niet meer gebruikt worden
+FIT_CACHE_VERSION = 1
+
+def cached_frame_path(cache_dir, file_hash):
+    return os.path.join(cache_dir, f"{file_hash}.v{FIT_CACHE_VERSION}.pkl")
+
+def read_cached_frame(cache_dir, file_hash, activity_id):
+    """Geeft het gecachete DataFrame voor file_hash terug (met activity_id als Activity_ID), of None."""
+    try:
+        df = pd.read_pickle(cached_frame_path(cache_dir, file_hash))
+    except Exception:
+        return None # Niet gecachet (of onleesbaar): opnieuw parsen
+    # Dezelfde inhoud kan onder een andere bestandsnaam geüpload zijn
+    if list(df['Activity_ID'].cat.categories) != [activity_id]:
+        df['Activity_ID'] = pd.Categorical([activity_id] * len(df))
+        df.attrs['session'] = {**df.attrs['session'], 'Activity_ID': activity_id}
+    return df
+
+def write_cached_frame(cache_dir, file_hash, df):
+    """Schrijft een geparst DataFrame naar de schijfcache; een mislukte schrijfactie wordt genegeerd."""
+    try:
+        atomic_pickle_dump(cached_frame_path(cache_dir, file_hash), df)
+    except OSError:
+        pass
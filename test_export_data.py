@@ -0,0 +1,148 @@
+import datetime
+
+import numpy as np
+import pandas as pd
+import pytest
+
+import export_data
+
+
+@pytest.mark.parametrize('n, n_out', [(0, 10), (5, 10), (10, 10), (100, 2), (100, 1)])
+def test_lttb_keeps_all_points_when_nothing_to_thin(n, n_out):
+    # Bij n <= n_out of n_out < 3 (te weinig punten voor begin, eind en één bucket) blijft alles staan
+    x = np.arange(n, dtype=float)
+    np.testing.assert_array_equal(export_data.lttb_indices(x, np.sin(x), n_out), np.arange(n))
+
+
+@pytest.mark.parametrize('n, n_out', [(4, 3), (101, 10), (10_000, 2000), (2001, 2000)])
+def test_lttb_selection(n, n_out):
+    rng = np.random.default_rng(n)
+    x = np.cumsum(rng.uniform(0.5, 2.0, n))
+    y = rng.normal(size=n)
+    indices = export_data.lttb_indices(x, y, n_out)
+
+    assert len(indices) == n_out
+    assert indices[0] == 0 and indices[-1] == n - 1
+    assert np.all(np.diff(indices) > 0) # Gesorteerd en zonder dubbele punten
+
+
+def test_lttb_keeps_a_spike():
+    y = np.zeros(1000)
+    y[537] = 10.0
+    assert 537 in export_data.lttb_indices(np.arange(1000, dtype=float), y, 50)
+
+
+def test_downsample_series():
+    df = pd.DataFrame({
+        'day': pd.date_range('2024-01-01', periods=5000, freq='D'),
+        'distance_km': np.arange(5000, dtype=np.float32),
+    })
+    short = df.iloc[:100]
+    assert export_data.downsample_series(short, 'day', 'distance_km') is short
+
+    thinned = export_data.downsample_series(df, 'day', 'distance_km', max_points=300)
+    assert len(thinned) == 300
+    assert thinned['day'].is_monotonic_increasing and thinned.index.is_unique
+    assert thinned.index[0] == 0 and thinned.index[-1] == 4999
+
+
+@pytest.mark.parametrize('value, max_parts, expected', [
+    ('1:02:03', 3, 3723),
+    ('01:02:03.5', 3, 3723.5),
+    ('5:30', 3, 330),
+    ('5:30', 2, 330),
+    ('1:02:03', 2, 0), # Een tempo heeft hooguit minuten en seconden
+    ('95', 3, 95),
+    ('--', 3, 0),
+    (np.nan, 3, 0),
+    (None, 2, 0),
+    ('onzin', 3, 0),
+])
+def test_parse_time_text(value, max_parts, expected):
+    values = pd.Series([value, '0:10'], index=[7, 8])
+    seconds = export_data.parse_time_column_to_seconds(values, max_parts)
+    assert seconds.index.tolist() == [7, 8]
+    assert seconds.tolist() == [expected, 10]
+
+
+def test_parse_time_excel_cells():
+    # calamine/openpyxl geven tijdcellen als datetime.time of timedelta, gemengd met tekst
+    values = pd.Series([datetime.time(1, 2, 3), pd.Timedelta(hours=26, seconds=5), datetime.timedelta(minutes=5, seconds=30),
+                        '0:45', np.nan, datetime.time(0, 5, 30)], dtype=object)
+    seconds = export_data.parse_time_column_to_seconds(values, max_parts=2)
+    assert seconds.tolist() == [3723, 93605, 330, 45, 0, 330]
+
+
+def test_parse_time_timedelta_column():
+    values = pd.Series(pd.to_timedelta(['1:02:03', None, '0:05:30']))
+    assert export_data.parse_time_column_to_seconds(values, max_parts=3).tolist() == [3723, 0, 330]
+
+
+def activities(dates):
+    df = pd.DataFrame({
+        'date': pd.to_datetime(dates),
+        'distance_km': np.arange(1, len(dates) + 1, dtype=np.float32),
+        'duration_seconds': np.full(len(dates), 600, dtype=np.float32),
+        'avg_heart_rate_bpm': np.array([140, 0, 150, 160, 0, 120][:len(dates)], dtype=np.float32),
+    })
+    export_data.add_period_columns(df)
+    return df
+
+
+def test_period_labels_are_ordered_categories():
+    # Niet op datum gesorteerd: de categorieën moeten toch chronologisch zijn
+    df = activities(['2024-03-05', '2023-11-20', '2024-01-10', '2023-11-22'])
+    for column in ['year_week', 'year_month']:
+        assert isinstance(df[column].dtype, pd.CategoricalDtype) and df[column].cat.ordered
+    assert list(df['year_week'].cat.categories) == ['2023-47', '2024-02', '2024-10']
+    assert df['year_week'].tolist() == ['2024-10', '2023-47', '2024-02', '2023-47']
+    assert list(df['year_month'].cat.categories) == ['2023-11', '2024-01', '2024-03']
+    assert df['year_month'].min() == '2023-11' and df['year_month'].max() == '2024-03'
+    assert df['date_week_start'].tolist() == pd.to_datetime(['2024-03-04', '2023-11-20', '2024-01-08', '2023-11-20']).tolist()
+    assert (df['date_week_end'] - df['date_week_start']).eq(pd.Timedelta(days=6)).all()
+
+
+def test_new_year_week_is_one_period():
+    # Maandag 30-12-2024 t/m zondag 05-01-2025 is één week, met het label van de maandag
+    df = activities(['2024-12-30', '2025-01-01', '2025-01-05', '2025-01-06'])
+    assert df['year_week'].tolist() == ['2024-53', '2024-53', '2024-53', '2025-01']
+    assert df['year_month'].tolist() == ['2024-12', '2025-01', '2025-01', '2025-01']
+
+    weekly = export_data.period_aggregates(df, 'year_week')
+    assert weekly['Periode'].tolist() == ['2024-53', '2025-01']
+    assert weekly['Totaal Afstand (km)'].tolist() == [6, 4]
+    assert weekly['Week Periode'].tolist() == ['30-12 t/m 05-01', '06-01 t/m 12-01']
+    assert weekly['Gem. Hartslag (bpm)'].tolist() == [145, 160] # Hartslag 0 telt niet mee
+
+    monthly = export_data.period_aggregates(df, 'year_month')
+    assert monthly['Periode'].tolist() == ['2024-12', '2025-01']
+    assert monthly['Totaal Afstand (km)'].tolist() == [1, 9]
+    assert monthly['Totale Duur (HH:MM:SS)'].tolist() == ['00:10:00', '00:30:00']
+
+
+def test_period_aggregates_follow_chronological_order():
+    # Lexicografisch zou '2024-10' voor '2024-2' komen; de geordende categorie houdt de tijdsvolgorde aan
+    df = activities(['2024-10-15', '2023-12-31', '2024-02-01'])
+    monthly = export_data.period_aggregates(df, 'year_month')
+    assert monthly['Periode'].tolist() == ['2023-12', '2024-02', '2024-10']
+    weekly = export_data.period_aggregates(df, 'year_week')
+    assert weekly['Periode'].tolist() == ['2023-52', '2024-05', '2024-42']
+    assert weekly['Datum Week Start'].is_monotonic_increasing
+
+
+def test_period_columns_without_dates():
+    df = pd.DataFrame({'date': pd.to_datetime([None, None])})
+    export_data.add_period_columns(df)
+    assert df['year_week'].tolist() == ['Onbekend', 'Onbekend']
+    assert df['date_week_start'].isna().all()
+
+
+def test_period_aggregates_without_float32_artifacts():
+    df = activities(['2024-05-06', '2024-05-07', '2024-05-08'])
+    df['distance_km'] = np.array([5.7, 40.0, 10.0], dtype=np.float32)
+    df['duration_seconds'] = np.array([1000.4, 2000.2, 3000.1], dtype=np.float32)
+    weekly = export_data.period_aggregates(df, 'year_week')
+    assert weekly['Totaal Afstand (km)'].dtype == np.float64
+    assert weekly['Totaal Afstand (km)'].tolist() == [55.7]
+    assert weekly['Gem. Afstand (km)'].tolist() == [18.57]
+    assert weekly['Totale Duur (sec)'].tolist() == [6001]
@@ -0,0 +1,124 @@
+import random
+import struct
+
+import numpy as np
+import pandas as pd
+import pytest
+from fitparse.records import Crc
+
+import fit_parser
+
+# (veldnummer, grootte, base type) van de record velden in het testbestand
+RECORD_FIELD_DEFS = [(253, 4, 0x86), (0, 4, 0x85), (1, 4, 0x85), (2, 2, 0x84), (3, 1, 0x02),
+                     (4, 1, 0x02), (5, 4, 0x86), (6, 2, 0x84), (7, 2, 0x84)]
+SESSION_FIELD_DEFS = [(253, 4, 0x86), (5, 1, 0x00), (11, 2, 0x84), (15, 2, 0x84), (22, 2, 0x84)]
+FORMATS = {0x86: 'I', 0x85: 'i', 0x84: 'H', 0x02: 'B', 0x00: 'B'}
+
+
+def definition_message(local_num, mesg_num, field_defs, big_endian=False):
+    endian = '>' if big_endian else '<'
+    return (bytes([0x40 | local_num, 0, int(big_endian)]) + struct.pack(endian + 'HB', mesg_num, len(field_defs))
+            + b''.join(bytes(field) for field in field_defs))
+
+
+def build_fit(n_records=200, big_endian=False, compressed_timestamps=False, missing_gps=False, seed=1):
+    """Bouwt een klein, geldig FIT-bestand met file_id, record en session berichten."""
+    rng = random.Random(seed)
+    endian = '>' if big_endian else '<'
+    record_fields = RECORD_FIELD_DEFS[1:] if compressed_timestamps else RECORD_FIELD_DEFS
+    timestamp = 1_000_000_000
+
+    body = definition_message(0, 0, [(0, 1, 0x00)]) + bytes([0x00, 4]) # file_id: type = activity
+    body += definition_message(1, fit_parser.RECORD_MESG_NUM, record_fields, big_endian)
+    if compressed_timestamps:
+        # Een bericht met een volledige tijdstempel als startpunt voor de compressed timestamp headers
+        body += definition_message(3, 21, [(253, 4, 0x86)]) + bytes([0x03]) + struct.pack('<I', timestamp)
+    for i in range(n_records):
+        timestamp += rng.choice([1, 1, 2, 40])
+        values = {
+            253: timestamp, 0: rng.randint(-10**9, 10**9), 1: rng.randint(-10**9, 10**9),
+            2: rng.randint(0, 60000), 3: rng.randint(50, 200), 4: rng.choice([90, 0xFF]),
+            5: i * 500, 6: rng.choice([3000, 0xFFFF]), 7: rng.randint(0, 500),
+        }
+        if missing_gps:
+            values[0] = values[1] = 0x7FFFFFFF
+        header = (0x80 | (1 << 5) | (timestamp & 0x1F)) if compressed_timestamps else 0x01
+        body += bytes([header]) + b''.join(struct.pack(endian + FORMATS[base_type], values[num])
+                                           for num, _, base_type in record_fields)
+    body += definition_message(2, fit_parser.SESSION_MESG_NUM, SESSION_FIELD_DEFS)
+    body += bytes([0x02]) + struct.pack('<IBHHH', timestamp, 2, 750, 12345, 321)
+
+    data = struct.pack('<BBHI4s', 12, 0x10, 2000, len(body), b'.FIT') + body
+    return data + struct.pack('<H', Crc.calculate(data))
+
+
+@pytest.mark.parametrize('options', [
+    {},
+    {'big_endian': True},
+    {'compressed_timestamps': True},
+    {'missing_gps': True},
+])
+def test_fast_decoder_matches_fitparse(options):
+    data = build_fit(**options)
+    fast_columns, fast_session = fit_parser._decode_fit_fast(data)
+    slow_columns, slow_session = fit_parser._decode_fit_fitparse(data)
+
+    assert fast_session == slow_session
+    slow = pd.DataFrame(slow_columns)
+    fast = pd.DataFrame(fast_columns)
+    assert set(fast.columns) == set(slow.columns)
+    for column in slow.columns:
+        if column == 'timestamp':
+            np.testing.assert_array_equal(fast[column].to_numpy(), pd.to_datetime(slow[column]).to_numpy())
+        else:
+            np.testing.assert_allclose(fast[column].to_numpy(dtype=float),
+                                       pd.to_numeric(slow[column]).to_numpy(dtype=float), err_msg=column)
+
+
+def test_corrupted_file_is_reported():
+    data = bytearray(build_fit())
+    data[200] ^= 0xFF
+    with pytest.raises(fit_parser.UnsupportedFitData):
+        fit_parser._decode_fit_fast(bytes(data))
+    # parse_fit_bytes valt terug op fitparse, die de CRC-fout meldt
+    with pytest.raises(Exception, match='CRC'):
+        fit_parser.parse_fit_bytes(bytes(data), 'beschadigd.fit')
+
+
+def test_chained_files_are_read_completely():
+    data = build_fit(n_records=100, seed=1) + build_fit(n_records=150, seed=2)
+    with pytest.raises(fit_parser.UnsupportedFitData):
+        fit_parser._decode_fit_fast(data)
+    # parse_fit_bytes valt terug op fitparse, die beide delen leest
+    df = fit_parser.parse_fit_bytes(data, 'gekoppeld.fit')
+    assert len(df) == 250
+
+
+def test_cached_frame_round_trip(tmp_path):
+    df = fit_parser.parse_fit_bytes(build_fit(), 'rit.fit')
+    fit_parser.write_cached_frame(str(tmp_path), 'abc', df)
+    assert [path.name for path in tmp_path.iterdir()] == [f'abc.v{fit_parser.FIT_CACHE_VERSION}.pkl']
+    cached = fit_parser.read_cached_frame(str(tmp_path), 'abc', 'rit.fit')
+    pd.testing.assert_frame_equal(cached, df)
+    assert cached.attrs == df.attrs
+
+
+def test_combine_activity_frames_matches_concat():
+    first = fit_parser.parse_fit_bytes(build_fit(n_records=120, seed=1), 'rit1.fit')
+    # Bestanden zonder GPS of zonder vermogensmeter missen die kolommen
+    second = fit_parser.parse_fit_bytes(build_fit(n_records=80, seed=2), 'rit2.fit').drop(columns=['Latitude', 'Longitude'])
+    third = fit_parser.parse_fit_bytes(build_fit(n_records=50, seed=3), 'rit3.fit').drop(columns=['Vermogen_watts', 'DatumTijd'])
+    third['Extra_int'] = np.arange(len(third), dtype=np.int32)
+    frames = [first, second, third]
+
+    combined = fit_parser.combine_activity_frames(frames)
+    expected = pd.concat(frames, ignore_index=True)
+
+    assert list(combined.columns) == list(expected.columns)
+    assert isinstance(combined['Activity_ID'].dtype, pd.CategoricalDtype)
+    assert list(combined['Activity_ID'].cat.categories) == ['rit1.fit', 'rit2.fit', 'rit3.fit']
+    # pd.concat maakt van categorieën met verschillende waarden object-kolommen; vergelijk daarom de waarden
+    for column in ['Activity_ID', 'Activiteitstype']:
+        assert combined[column].tolist() == expected[column].tolist()
+    pd.testing.assert_frame_equal(combined.drop(columns=['Activity_ID', 'Activiteitstype']),
+                                  expected.drop(columns=['Activity_ID', 'Activiteitstype']))
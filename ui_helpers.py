@@ -0,0 +1,42 @@
+import streamlit as st
+import shutil
+
+# Streamlit-onderdelen die door beide dashboards (dashboard.py en LeesMoreFit.py) gebruikt worden.
+
+@st.cache_data(show_spinner=False)
+def to_csv_bytes(df):
+    """Zet een DataFrame om naar CSV-bytes voor de downloadknoppen (gecachet per DataFrame)."""
+    return df.to_csv(index=False).encode('utf-8')
+
+def select_view(options):
+    """
+    Toont de keuze van de weergave en geeft de gekozen optie terug.
+    Een radio i.p.v. st.tabs: Streamlit voert alle tabbladen bij elke rerun uit, zo wordt alleen
+    de zichtbare weergave berekend en getekend.
+    """
+    return st.radio("Weergave", options, horizontal=True, label_visibility="collapsed", key="active_view")
+
+def clear_cache_button(cache_dir, cached_function, session_key, help_text):
+    """
+    Knop die de bewaarde verwerkte bestanden wist (bijv. na een wijziging in de verwerking): de cachemap op schijf,
+    de st.cache_data-cache van cached_function en de sessiesleutel, zodat alles opnieuw ingelezen wordt.
+    """
+    if st.button("Cache wissen", help=help_text):
+        shutil.rmtree(cache_dir, ignore_errors=True)
+        cached_function.clear()
+        st.session_state.pop(session_key, None)
+
+def show_paginated_dataframe(df, page_size, key="raw_data_page", **dataframe_kwargs):
+    """
+    Toont df per pagina van page_size rijen, zodat niet het hele DataFrame naar de browser gestuurd wordt.
+    Wordt de data kleiner (bijv. door een filter of een ander bestand), dan springt de pagina terug naar de laatste die nog bestaat.
+    """
+    max_page = max(1, -(-len(df) // page_size)) # Afronden naar boven
+    # Een bewaarde waarde boven max_value geeft anders een fout bij het aanmaken van de widget
+    if st.session_state.get(key, 1) > max_page:
+        st.session_state[key] = max_page
+    page = min(st.number_input("Pagina", min_value=1, max_value=max_page, step=1, key=key), max_page)
+    first_row = (page - 1) * page_size
+    last_row = min(first_row + page_size, len(df))
+    st.caption(f"Rijen {min(first_row + 1, last_row)} t/m {last_row} van {len(df)}")
+    st.dataframe(df.iloc[first_row:last_row], **dataframe_kwargs)
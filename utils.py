@@ -0,0 +1,47 @@
+import hashlib
+import os
+
+import numpy as np
+import pandas as pd
+
+# Hulpfuncties die door beide dashboards (dashboard.py en LeesMoreFit.py) gebruikt worden.
+# Bevat geen Streamlit-aanroepen, zodat ook fit_parser en de tests ze kunnen importeren.
+
+def format_duration(seconds):
+    """Formateert een aantal seconden naar HH:MM:SS string."""
+    if pd.isna(seconds) or seconds == 0:
+        return "00:00:00"
+    seconds = int(seconds)
+    hours = seconds // 3600
+    minutes = (seconds % 3600) // 60
+    seconds = seconds % 60
+    return f"{hours:02d}:{minutes:02d}:{seconds:02d}"
+
+def format_duration_column(seconds):
+    """Formatteert een hele kolom seconden naar HH:MM:SS strings (uren/minuten/seconden in één keer voor de hele kolom)."""
+    total_seconds = seconds.fillna(0).to_numpy(dtype=np.int64)
+    hours, rest = np.divmod(total_seconds, 3600)
+    minutes, secs = np.divmod(rest, 60)
+    return pd.Series([f"{h:02d}:{m:02d}:{sec:02d}" for h, m, sec in zip(hours, minutes, secs)], index=seconds.index)
+
+def file_digest(file_obj, chunk_size=1 << 16):
+    """
+    Berekent een snelle hash van de bestandsinhoud, te gebruiken als cachesleutel.
+    Leest het bestand in blokken (zonder extra kopie van de volledige inhoud) en zet het daarna terug op positie 0.
+    """
+    file_obj.seek(0)
+    digest = hashlib.blake2b(digest_size=16)
+    for chunk in iter(lambda: file_obj.read(chunk_size), b''):
+        digest.update(chunk)
+    file_obj.seek(0)
+    return digest.hexdigest()
+
+def atomic_pickle_dump(path, obj):
+    """
+    Schrijft obj als pickle naar path via een tijdelijk bestand en os.replace, zodat een andere
+    sessie of proces nooit een half geschreven cachebestand leest. Fouten (OSError) worden doorgegeven.
+    """
+    os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+    temp_path = f"{path}.{os.getpid()}.tmp"
+    pd.to_pickle(obj, temp_path)
+    os.replace(temp_path, path)